@@ -5,6 +5,7 @@ const axios = require("axios");
 const { v4: uuidv4 } = require('uuid');
 const cookieParser = require('cookie-parser');
 const { initializeLogger, logger, closeLogger } = require('./logger');
+const { initializeEvents, publishEvent, closeEvents } = require('./events');
 
 const app = express();
 
@@ -118,6 +119,17 @@ app.get('/internal/courses/:id/exists', async (req, res) => {
   }
 });
 
+// Seznam vseh ID-jev tečajev (za začetno polnjenje/resinhronizacijo replik v drugih storitvah)
+app.get('/internal/courses/ids', async (req, res) => {
+  try {
+    const result = await query("SELECT id FROM courses ORDER BY id", []);
+    res.json({ ids: result.rows.map((r) => r.id) });
+  } catch (err) {
+    logger.error(req.path, req.correlationId, `Error listing course ids: ${err.message}`);
+    res.status(500).json({ message: "Error listing course ids" });
+  }
+});
+
 // Cookie-based auth middleware for Swagger UI
 function swaggerAuthMiddleware(req, res, next) {
   const token = req.cookies.auth_token;
@@ -278,6 +290,7 @@ app.post("/courses", async (req, res) => {
       [title, description || null, owner_user_id]
     );
     logger.info(req.path, req.correlationId, `Course created successfully with id ${result.rows[0].id}`);
+    publishEvent('course.created', { id: result.rows[0].id });
     res.status(201).json(result.rows[0]);
   } catch (err) {
     logger.error(req.path, req.correlationId, `Error creating course: ${err.message}`);
@@ -306,6 +319,7 @@ app.post("/courses/:id/duplicate", async (req, res) => {
       [c.title + " (copy)", c.description, c.owner_user_id]
     );
     logger.info(req.path, req.correlationId, `Course duplicated successfully, new id: ${result.rows[0].id}`);
+    publishEvent('course.created', { id: result.rows[0].id });
     res.status(201).json(result.rows[0]);
   } catch (err) {
     logger.error(req.path, req.correlationId, `Error duplicating course: ${err.message}`);
@@ -377,6 +391,7 @@ app.delete("/courses/:id", async (req, res) => {
   try {
     logger.info(req.path, req.correlationId, `Deleting course with id ${req.params.id}`);
     await query("DELETE FROM courses WHERE id = $1", [req.params.id]);
+    publishEvent('course.deleted', { id: Number(req.params.id) });
     logger.info(req.path, req.correlationId, `Course with id ${req.params.id} deleted successfully`);
     res.json({ message: "Course deleted" });
   } catch (err) {
@@ -391,6 +406,7 @@ app.delete("/courses", async (req, res) => {
   try {
     logger.info(req.path, req.correlationId, "Deleting all courses");
     await query("DELETE FROM courses", []);
+    publishEvent('course.deleted_all');
     logger.info(req.path, req.correlationId, "All courses deleted successfully");
     res.json({ message: "All courses deleted" });
   } catch (err) {
@@ -408,6 +424,8 @@ initDb()
     return initializeLogger();
   })
   .then(() => {
+    // dogodki niso pogoj za zagon; povezava se vzpostavi v ozadju
+    initializeEvents();
     const server = app.listen(PORT, () => {
       logger.info('localhost', 'startup', `Course service listening on port ${PORT}`);
     });
@@ -416,6 +434,7 @@ initDb()
     process.on('SIGTERM', async () => {
       logger.info('localhost', 'shutdown', 'SIGTERM received, shutting down gracefully');
       server.close(async () => {
+        await closeEvents();
         await closeLogger();
         process.exit(0);
       });
@@ -424,6 +443,7 @@ initDb()
     process.on('SIGINT', async () => {
       logger.info('localhost', 'shutdown', 'SIGINT received, shutting down gracefully');
       server.close(async () => {
+        await closeEvents();
         await closeLogger();
         process.exit(0);
       });
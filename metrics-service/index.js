@@ -412,6 +412,113 @@ app.post('/metrics/record', async (req, res) => {
   }
 });
 
+/**
+ * @swagger
+ * /metrics/record-batch:
+ *   post:
+ *     summary: Zabeleži paket agregiranih klicev
+ *     description: Storitve pošljejo histogram odzivnih časov na endpoint/metodo namesto enega zahtevka na klic
+ *     requestBody:
+ *       required: true
+ *       content:
+ *         application/json:
+ *           schema:
+ *             type: object
+ *             required:
+ *               - calls
+ *             properties:
+ *               service_name:
+ *                 type: string
+ *               calls:
+ *                 type: array
+ *                 items:
+ *                   type: object
+ *                   properties:
+ *                     klicanaStoritev:
+ *                       type: string
+ *                     method:
+ *                       type: string
+ *                     histogram:
+ *                       type: array
+ *                       description: 'Pari [response_time_ms, število klicev]'
+ *                       items:
+ *                         type: array
+ *                         items:
+ *                           type: integer
+ *     responses:
+ *       200:
+ *         description: Uspešno zabeležen paket
+ *       400:
+ *         description: Manjkajo zahtevani podatki
+ *       500:
+ *         description: Napaka pri beleženju klicev
+ */
+app.post('/metrics/record-batch', async (req, res) => {
+  try {
+    const { service_name = 'unknown', calls } = req.body;
+
+    if (!Array.isArray(calls)) {
+      return res.status(400).json({
+        error: 'Manjkajo zahtevani podatki',
+        required: ['calls']
+      });
+    }
+
+    const endpoints = [];
+    const methods = [];
+    const times = [];
+    const counts = [];
+    let slowest = null;
+    for (const call of calls) {
+      if (!call || !call.klicanaStoritev || !Array.isArray(call.histogram)) continue;
+      for (const [ms, count] of call.histogram) {
+        if (!Number.isInteger(count) || count <= 0) continue;
+        endpoints.push(call.klicanaStoritev);
+        methods.push(call.method || 'GET');
+        times.push(Number.isFinite(ms) ? Math.round(ms) : null);
+        counts.push(count);
+        if (ms > 1000 && (!slowest || ms > slowest.response_time_ms)) {
+          slowest = { endpoint: call.klicanaStoritev, method: call.method || 'GET', response_time_ms: ms };
+        }
+      }
+    }
+
+    // One row per call keeps call-counts/most-called queries unchanged
+    const result = await query(
+      `INSERT INTO api_calls (service_name, endpoint, method, response_time_ms)
+       SELECT $1, c.endpoint, c.method, c.ms
+       FROM unnest($2::text[], $3::text[], $4::int[], $5::int[]) AS c(endpoint, method, ms, n),
+            generate_series(1, c.n);`,
+      [service_name, endpoints, methods, times, counts]
+    );
+
+    console.log(`[${req.correlationId}] Recorded ${result.rowCount} API calls from ${service_name}`);
+
+    if (slowest) {
+      axios.post(`${LOG_SERVICE_URL}/internal/log`, {
+        service: 'metrics-service',
+        level: 'warn',
+        message: `Slow endpoint detected: ${service_name} -> ${slowest.endpoint} (${slowest.response_time_ms}ms)`,
+        metadata: { ...slowest, service_name }
+      }, {
+        headers: {
+          'x-correlation-id': req.correlationId
+        }
+      }).catch(err => {
+        console.warn(`[${req.correlationId}] Failed to notify log-service:`, err.message);
+      });
+    }
+
+    res.status(200).json({
+      message: 'Klici so bili uspešno zabeleženi',
+      recorded: result.rowCount
+    });
+  } catch (err) {
+    console.error(`[${req.correlationId}] Error recording API call batch:`, err.message);
+    res.status(500).json({ error: 'Napaka pri beleženju klicev' });
+  }
+});
+
 // ===== DELETE BACKLOG =====
 app.delete('/metrics/backlog', async (req, res) => {
   try {
@@ -0,0 +1,74 @@
+"""Compare list serialization paths on synthetic study_sessions rows.
+
+Run from planner-service/:  python -m bench.serialization [rows] [repeats]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+
+from main import StudySessionOut, session_dict, json_response
+
+
+def make_rows(n):
+    start = datetime(2025, 1, 6, 8, 0)
+    weather = {"city": "ljubljana", "conditions": "cloudy", "tempC": 7, "humidity": 81}
+    return [
+        (i, i % 50 + 1, i % 12 + 1, f"Study block {i}", start + timedelta(hours=i), start + timedelta(hours=i, minutes=90),
+         "PLANNED", "ljubljana", weather)
+        for i in range(1, n + 1)
+    ]
+
+
+def pydantic_path(rows):
+    # what list_sessions did before: build models per row, then response_model
+    # validation + serialization and JSONResponse's json.dumps
+    adapter = TypeAdapter(List[StudySessionOut])
+    models = [
+        StudySessionOut(
+            id=r[0], user_id=r[1], course_id=r[2], title=r[3],
+            start_time=r[4].isoformat(), end_time=r[5].isoformat(),
+            status=r[6], city=r[7], weather_snapshot=r[8],
+        )
+        for r in rows
+    ]
+    validated = adapter.validate_python(models)
+    return json.dumps(adapter.dump_python(validated, mode="json"), separators=(",", ":")).encode()
+
+
+def fast_path(rows):
+    return json_response([session_dict(r) for r in rows]).body
+
+
+def measure(fn, rows, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rows = make_rows(n)
+    assert json.loads(pydantic_path(rows)) == json.loads(fast_path(rows)), "paths must produce the same JSON"
+
+    slow = measure(pydantic_path, rows, repeats)
+    fast = measure(fast_path, rows, repeats)
+    print(json.dumps({
+        "rows": n,
+        "pydantic_ms": round(slow * 1000, 2),
+        "fast_ms": round(fast * 1000, 2),
+        "pydantic_rows_per_s": round(n / slow),
+        "fast_rows_per_s": round(n / fast),
+        "speedup": round(slow / fast, 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from collections import deque
+
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class DownstreamUnavailable(Exception):
+    """A downstream service is failing (or its breaker is open) and there is no fallback answer"""
+
+    def __init__(self, service, retry_after=0.0):
+        super().__init__(f"{service}-service unavailable")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens when the failure rate over the last `window` calls reaches `failure_rate`,
+    rejects calls for `open_seconds`, then lets `half_open_probes` calls through to decide
+    whether to close again"""
+
+    def __init__(self, name, failure_rate=BREAKER_FAILURE_RATE, window=BREAKER_WINDOW,
+                 min_calls=BREAKER_MIN_CALLS, open_seconds=BREAKER_OPEN_SECONDS,
+                 half_open_probes=BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True = success
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.opened += 1
+        print(f"[Breaker] {self.name} opened for {self.open_seconds}s")
+
+    def allow(self):
+        """Whether a call may go out now; every allowed call must be followed by record()"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, ok):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if ok:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    print(f"[Breaker] {self.name} closed")
+                else:
+                    self._open(time.monotonic())
+                return
+            if self.state == OPEN:
+                return
+            self._outcomes.append(ok)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._outcomes.count(False) / calls >= self.failure_rate:
+                self._open(time.monotonic())
+
+    def retry_after(self):
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "state": self.state,
+                "failure_rate": round(self._outcomes.count(False) / calls, 4) if calls else 0.0,
+                "calls_in_window": calls,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+breakers = {name: CircuitBreaker(name) for name in ("user", "course", "weather")}
+
+
+def breaker_stats():
+    return {name: b.stats() for name, b in breakers.items()}
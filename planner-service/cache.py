@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry and separate TTL for falsy (negative) values.
+
+    With maxbytes (and sizeof, the size of a value) it is also bounded by total size;
+    a value larger than maxbytes on its own is not stored.
+    """
+
+    def __init__(self, maxsize, ttl, negative_ttl=None, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            # expired entries stay until evicted or overwritten, for get_stale
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, key, default=MISSING):
+        """Last stored value for key even if expired, e.g. as a fallback while its source is down"""
+        with self._lock:
+            entry = self._data.get(key)
+            return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl if value else self.negative_ttl
+        if ttl <= 0:
+            return
+        size = self.sizeof(value) if self.maxbytes is not None else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._bytes -= self._data.popitem(last=False)[1][2]
+                self.evictions += 1
+
+    def invalidate(self, key=MISSING):
+        """Drop one key, or everything when called without a key"""
+        with self._lock:
+            if key is MISSING:
+                self._data.clear()
+                self._bytes = 0
+            else:
+                entry = self._data.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry[2]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+            if self.maxbytes is not None:
+                stats.update(bytes=self._bytes, maxbytes=self.maxbytes)
+            return stats
+
+
+class StaleWhileRevalidateCache:
+    """Async cache that serves stale entries while refreshing them, with one in-flight load per key"""
+
+    def __init__(self, fresh_ttl, stale_ttl, maxsize=256):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = max(stale_ttl, fresh_ttl)
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (value, fetched_at)
+        self._inflight = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+
+    def _store(self, key, value):
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _load(self, key, loader):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+
+        async def run():
+            try:
+                value = await loader()
+                if value is not None:
+                    self._store(key, value)
+                return value
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        return task
+
+    async def get(self, key, loader):
+        """Return the cached value for key, calling the async loader on miss; None results are not cached"""
+        entry = self._data.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[1]
+            if age < self.fresh_ttl:
+                self.hits += 1
+                return entry[0]
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self.refreshes += 1
+                    self._load(key, loader)
+                return entry[0]
+            del self._data[key]
+        self.misses += 1
+        # shield so a cancelled caller doesn't cancel the load shared with others
+        return await asyncio.shield(self._load(key, loader))
+
+    def invalidate(self, key=MISSING):
+        if key is MISSING:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,414 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from perf import span
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# connections idle for longer than this are pinged with SELECT 1 before reuse
+DB_POOL_CHECK_IDLE = float(os.getenv("DB_POOL_CHECK_IDLE", "30"))
+
+# Read replica: used only while its replay lag stays under DB_REPLICA_MAX_LAG
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_LAG_CHECK = float(os.getenv("DB_REPLICA_LAG_CHECK", "2"))
+# after a connection or query failure the replica is skipped for this long
+DB_REPLICA_RETRY = float(os.getenv("DB_REPLICA_RETRY", "10"))
+# a busy replica pool sends the read to the primary instead of queueing
+DB_REPLICA_ACQUIRE_TIMEOUT = float(os.getenv("DB_REPLICA_ACQUIRE_TIMEOUT", "0.1"))
+# reads for a user that wrote within this window (or the current lag, if longer) go to the primary
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+
+pool = None
+read_pool = None
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the acquire timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool with blocking acquire and health checks"""
+
+    def __init__(self, config, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 timeout=DB_POOL_TIMEOUT, check_idle=DB_POOL_CHECK_IDLE):
+        self.config = config
+        self.minconn = minconn
+        self.maxconn = max(maxconn, 1)
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, released_at)
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._acquired = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        for _ in range(min(minconn, self.maxconn)):
+            self._size += 1
+            try:
+                self._idle.append((self._connect(), time.monotonic()))
+            except Exception:
+                self._size -= 1
+                raise
+
+    def _connect(self):
+        return psycopg2.connect(**self.config)
+
+    def _healthy(self, conn, released_at):
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - released_at < self.check_idle:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _drop(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            candidate = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("connection pool is closed")
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"no database connection available after {timeout}s")
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                    if self._closed:
+                        raise PoolTimeout("connection pool is closed")
+                if self._idle:
+                    candidate = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+                self._in_use += 1
+
+            try:
+                if create:
+                    conn = self._connect()
+                elif self._healthy(*candidate):
+                    conn = candidate[0]
+                else:
+                    with self._cond:
+                        self._in_use -= 1
+                    self._drop(candidate[0])
+                    continue
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    if create:
+                        self._size -= 1
+                    self._cond.notify()
+                raise
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._acquired += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                pass
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._drop(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "wait_avg_ms": round(self._wait_total * 1000 / self._acquired, 3) if self._acquired else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._drop(conn)
+
+
+def initialize_pool(config):
+    """Create the shared connection pool"""
+    global pool
+    if pool is None:
+        pool = ConnectionPool(config)
+        print(f"[DB] Connection pool ready (min={pool.minconn}, max={pool.maxconn})")
+    return pool
+
+
+class ReadRouter:
+    """Decides per read whether the replica may answer it.
+
+    The replica is skipped while it lags by more than DB_REPLICA_MAX_LAG, after it
+    failed, and for users with a write in the last READ_YOUR_WRITES_WINDOW seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._writes = {}  # user id -> monotonic time of the last write
+        self.lag = None
+        self._lag_checked = float("-inf")
+        self._checking = False
+        self._down_until = 0.0
+        self.routed = {"replica": 0, "primary_recent_write": 0, "primary_lag": 0, "primary_down": 0, "primary_busy": 0}
+
+    def note_write(self, user_ids):
+        """Record a write for these users"""
+        now = time.monotonic()
+        with self._lock:
+            for user_id in user_ids:
+                if user_id is not None:
+                    self._writes[user_id] = now
+
+    def _window(self):
+        return max(READ_YOUR_WRITES_WINDOW, self.lag or 0.0)
+
+    def wrote_recently(self, user_ids):
+        horizon = time.monotonic() - self._window()
+        with self._lock:
+            return any(self._writes.get(user_id, float("-inf")) > horizon for user_id in user_ids)
+
+    def mark_down(self, reason):
+        reason = " ".join(reason.split())
+        with self._lock:
+            self._down_until = time.monotonic() + DB_REPLICA_RETRY
+        print(f"[DB] Replica unavailable ({reason}), reading from primary for {DB_REPLICA_RETRY}s")
+
+    def count(self, route):
+        with self._lock:
+            self.routed[route] += 1
+
+    def check_lag(self, owner):
+        """Refresh the replay lag every DB_REPLICA_LAG_CHECK seconds; one caller measures, others reuse"""
+        now = time.monotonic()
+        with self._lock:
+            if self._checking or now - self._lag_checked < DB_REPLICA_LAG_CHECK:
+                return
+            self._checking = True
+        try:
+            conn = owner.getconn(timeout=DB_REPLICA_ACQUIRE_TIMEOUT)
+            discard = False
+            try:
+                cur = conn.cursor()
+                # fully replayed counts as no lag, even when the primary has been idle for a while;
+                # a server that isn't in recovery (e.g. the primary itself) has no lag either
+                cur.execute(
+                    """
+                    SELECT CASE WHEN NOT pg_is_in_recovery()
+                                  OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                ELSE COALESCE(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+                           END
+                    """
+                )
+                self.lag = float(cur.fetchone()[0])
+                cur.close()
+                conn.rollback()
+            except Exception:
+                discard = True
+                raise
+            finally:
+                owner.putconn(conn, discard=discard)
+            self._prune(now)
+        except PoolTimeout:
+            pass
+        except Exception as e:
+            self.mark_down(str(e).strip())
+        finally:
+            with self._lock:
+                self._lag_checked = now
+                self._checking = False
+
+    def _prune(self, now):
+        horizon = now - self._window()
+        with self._lock:
+            self._writes = {u: t for u, t in self._writes.items() if t > horizon}
+
+    def choose(self, owner, user_ids):
+        """The route for a read by/for user_ids: "replica" or why it goes to the primary"""
+        if time.monotonic() < self._down_until:
+            return "primary_down"
+        self.check_lag(owner)
+        if time.monotonic() < self._down_until:
+            return "primary_down"
+        if self.lag is None or self.lag > DB_REPLICA_MAX_LAG:
+            return "primary_lag"
+        if self.wrote_recently(user_ids):
+            return "primary_recent_write"
+        return "replica"
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lag_s": round(self.lag, 3) if self.lag is not None else None,
+                "down": time.monotonic() < self._down_until,
+                "window_s": round(self._window(), 3),
+                "recent_writers": len(self._writes),
+                "routed": dict(self.routed),
+            }
+
+
+router = ReadRouter()
+
+
+def initialize_read_pool(config):
+    """Create the replica pool; connections are opened lazily so a down replica doesn't block startup.
+
+    Every checkout is pinged: a connection the replica dropped is replaced or, if the
+    replica is gone, the read falls back to the primary instead of failing mid-query.
+    """
+    global read_pool
+    if read_pool is None:
+        read_pool = ConnectionPool(config, minconn=0, check_idle=0)
+        print(f"[DB] Read replica pool ready (max={read_pool.maxconn})")
+    return read_pool
+
+
+@contextmanager
+def _lease(owner, conn):
+    discard = False
+    try:
+        with span("db"):
+            yield conn
+    except psycopg2.InterfaceError:
+        discard = True
+        raise
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            discard = True
+        raise
+    finally:
+        owner.putconn(conn, discard=discard)
+
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection; it is returned (or discarded if broken) on exit"""
+    owner = pool
+    with span("pool"):
+        conn = owner.getconn()
+    with _lease(owner, conn):
+        yield conn
+
+
+@contextmanager
+def get_read_conn(*user_ids):
+    """Borrow a connection for a read-only query, from the replica when it may answer.
+
+    user_ids are the reader and the users whose data is read; any of them having
+    written recently keeps the read on the primary so it sees its own writes.
+    """
+    owner = read_pool
+    conn = None
+    if owner is not None:
+        route = router.choose(owner, user_ids)
+        if route == "replica":
+            with span("pool"):
+                try:
+                    conn = owner.getconn(timeout=DB_REPLICA_ACQUIRE_TIMEOUT)
+                except PoolTimeout:
+                    route = "primary_busy"
+                except psycopg2.Error as e:
+                    router.mark_down(str(e).strip())
+                    route = "primary_down"
+        router.count(route)
+    if conn is None:
+        with get_conn() as conn:
+            yield conn
+        return
+    try:
+        with _lease(owner, conn):
+            yield conn
+    except psycopg2.OperationalError as e:
+        router.mark_down(str(e).strip())
+        raise
+
+
+def note_write(user_ids):
+    """Keep these users' reads on the primary for the read-your-writes window"""
+    if read_pool is not None:
+        router.note_write(user_ids)
+
+
+def pool_stats():
+    return pool.stats() if pool is not None else {}
+
+
+def read_routing_stats():
+    if read_pool is None:
+        return {"replica": False}
+    return {"replica": True, "pool": read_pool.stats(), **router.stats()}
+
+
+def close_pool():
+    """Close all pooled connections"""
+    global pool, read_pool
+    if read_pool is not None:
+        read_pool.close()
+        read_pool = None
+    if pool is not None:
+        pool.close()
+        pool = None
+        print("[DB] Connection pool closed")
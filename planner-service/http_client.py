@@ -0,0 +1,37 @@
+import os
+
+import httpx
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "2"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+client = None
+
+
+def initialize_http_client():
+    """Create the shared keep-alive client used for calls to other services"""
+    global client
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return client
+
+
+def get_http_client():
+    return client if client is not None else initialize_http_client()
+
+
+async def close_http_client():
+    """Close pooled outbound connections"""
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
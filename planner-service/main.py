@@ -1,15 +1,39 @@
 import os
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, Query
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List
-import psycopg2
-from psycopg2.extras import Json
-import requests
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from psycopg2.extras import Json, execute_values
+from psycopg2.extensions import quote_ident
+from psycopg2 import OperationalError
+from psycopg2.errors import ExclusionViolation, LockNotAvailable
 from datetime import datetime
 import jwt
 import uuid
-from logger import initialize_logger, log_info, log_error, close_logger
+import hashlib
+import base64
+import json
+import orjson
+import zlib
+import random
+import re
+import time
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from logger import initialize_logger, log_info, log_error, close_logger, logger_stats
+from db import (initialize_pool, initialize_read_pool, get_conn, get_read_conn, note_write, close_pool, pool_stats,
+                read_routing_stats, PoolTimeout)
+from http_client import initialize_http_client, get_http_client, close_http_client
+from cache import TTLCache, StaleWhileRevalidateCache, MISSING
+from metrics import metrics_aggregator, METRICS_ENABLED
+from perf import span, start_request, server_timing, perf_aggregator
+import prometheus
+from breaker import breakers, breaker_stats, DownstreamUnavailable, STATE_CODES, OPEN
+from replica import IdReplica, start_replicas, stop_replicas, replica_stats
+from changes import (start_change_feed, stop_change_feed, get_change_feed, change_feed_stats, change_dict,
+                     encode_change_cursor, decode_change_cursor, CHANGES_VISIBLE, CHANGE_COLUMNS, CHANGES_END_SQL,
+                     CHANGES_POLL_INTERVAL)
+from starlette.concurrency import run_in_threadpool
 
 import pathlib
 
@@ -21,33 +45,65 @@ if not JWT_PUBLIC_KEY and JWT_PUBLIC_KEY_PATH and pathlib.Path(JWT_PUBLIC_KEY_PA
     with open(JWT_PUBLIC_KEY_PATH, 'r', encoding='utf-8') as f:
         JWT_PUBLIC_KEY = f.read()
 
+# parse the PEM once instead of on every decode
+if JWT_PUBLIC_KEY:
+    JWT_KEY, JWT_ALGORITHMS = load_pem_public_key(JWT_PUBLIC_KEY.encode()), ["RS256"]
+else:
+    JWT_KEY, JWT_ALGORITHMS = JWT_SECRET, ["HS256"]
+
+# Verified claims keyed by token digest; entries never outlive the token's exp
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "300"))
+jwt_cache = TTLCache(JWT_CACHE_SIZE, JWT_CACHE_TTL)
+
+AUTH_DEBUG_SAMPLE_RATE = float(os.getenv("AUTH_DEBUG_SAMPLE_RATE", "0"))
+
+
+def auth_debug(message: str):
+    if AUTH_DEBUG_SAMPLE_RATE and random.random() < AUTH_DEBUG_SAMPLE_RATE:
+        print(f"[AUTH] {message}")
+
 
-def get_current_user(request: Request):
+def verify_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = jwt_cache.get(key)
+    if payload is not MISSING:
+        if payload.get("exp") is None or payload["exp"] > time.time():
+            return payload
+        jwt_cache.invalidate(key)
+    payload = jwt.decode(token, JWT_KEY, algorithms=JWT_ALGORITHMS)
+    ttl = JWT_CACHE_TTL
+    if payload.get("exp") is not None:
+        ttl = min(ttl, payload["exp"] - time.time())
+    jwt_cache.set(key, payload, ttl=ttl)
+    return payload
+
+
+async def get_current_user(request: Request):
     auth = request.headers.get("Authorization")
     if not auth:
-        print(f"[AUTH] No Authorization header")
+        auth_debug("No Authorization header")
         raise HTTPException(status_code=401, detail="Authorization header required")
     parts = auth.split()
     if len(parts) != 2 or parts[0].lower() != "bearer":
-        print(f"[AUTH] Invalid auth header format: {auth[:50]}")
+        auth_debug(f"Invalid auth header format: {auth[:50]}")
         raise HTTPException(status_code=401, detail="Invalid auth header")
     token = parts[1]
     try:
-        if JWT_PUBLIC_KEY:
-            print(f"[AUTH] Decoding with RS256, key present: {bool(JWT_PUBLIC_KEY)}, token: {token[:20]}...")
-            payload = jwt.decode(token, JWT_PUBLIC_KEY, algorithms=["RS256"])
-        else:
-            print(f"[AUTH] Decoding with HS256")
-            payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        with span("jwt"):
+            payload = verify_token(token)
         # attach token to request state for downstream calls
         request.state.token = token
-        print(f"[AUTH] Token decoded successfully, user_id: {payload.get('id')}")
+        auth_debug(f"Token verified, user_id: {payload.get('id')}")
+        if request.method not in ("GET", "HEAD"):
+            # the caller's next reads go to the primary (read-your-writes)
+            note_write([payload.get("id")])
         return {"payload": payload, "token": token}
     except jwt.ExpiredSignatureError as e:
-        print(f"[AUTH] Token expired: {e}")
+        auth_debug(f"Token expired: {e}")
         raise HTTPException(status_code=401, detail="Token expired")
     except Exception as e:
-        print(f"[AUTH] Token decode failed: {type(e).__name__}: {e}")
+        auth_debug(f"Token decode failed: {type(e).__name__}: {e}")
         raise HTTPException(status_code=401, detail="Invalid token")
 
 # determine whether to expose docs
@@ -67,6 +123,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "HEAD", "PUT", "PATCH", "POST", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
 
 # Correlation ID middleware
@@ -78,38 +135,37 @@ async def add_correlation_id(request: Request, call_next):
     response.headers["x-correlation-id"] = correlation_id
     return response
 
-# Metrics reporting middleware
+# Metrics reporting middleware - only records into the in-process aggregator,
+# a background worker ships batched histograms to metrics-service
 import asyncio
-import time
 @app.middleware("http")
 async def report_metrics(request: Request, call_next):
-    start_time = time.time()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    response_time_ms = int((time.time() - start_time) * 1000)
-    
-    # Send metrics asynchronously
-    metrics_service_url = os.getenv("METRICS_SERVICE_URL", "http://localhost:4007")
-    asyncio.create_task(send_metrics(
-        metrics_service_url,
-        request.url.path,
-        request.method,
-        "planner-service",
-        response_time_ms,
-        request.state.correlation_id
-    ))
-    
+    elapsed = time.perf_counter() - start_time
+    if METRICS_ENABLED:
+        metrics_aggregator.record(request.url.path, request.method, elapsed * 1000)
+    # route template, not the raw path, keeps label cardinality bounded
+    route = request.scope.get("route")
+    labels = (route.path if route else "unmatched", request.method, str(response.status_code))
+    prometheus.http_requests_total.inc(labels)
+    prometheus.http_request_duration.observe(labels, elapsed)
     return response
 
-async def send_metrics(url, endpoint, method, service_name, response_time_ms, correlation_id):
-    try:
-        requests.post(f"{url}/metrics/record", json={
-            "klicanaStoritev": endpoint,
-            "method": method,
-            "service_name": service_name,
-            "response_time_ms": response_time_ms
-        }, timeout=2)
-    except Exception as e:
-        print(f"[{correlation_id}] Failed to record metric: {e}")
+# Phase timing for a sample of requests: spans (jwt, exists, weather, pool, db, log)
+# go out as a Server-Timing header and into the rolling stats at /internal/perf
+@app.middleware("http")
+async def phase_timing(request: Request, call_next):
+    timings = start_request()
+    if timings is None:
+        return await call_next(request)
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    timings["total"] = (time.perf_counter() - start_time) * 1000
+    response.headers["Server-Timing"] = server_timing(timings)
+    route = request.scope.get("route")
+    perf_aggregator.record(f"{request.method} {route.path if route else request.url.path}", timings)
+    return response
 
 app.add_middleware(
     CORSMiddleware,
@@ -117,6 +173,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
 # Database config
 DB_CONFIG = {
@@ -126,41 +183,578 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD", "planner_password"),
     "dbname": os.getenv("DB_NAME", "planner_db"),
 }
+# Optional streaming replica (libpq DSN) for list/get/stats reads; writes always use DB_CONFIG
+DB_REPLICA_DSN = os.getenv("DB_REPLICA_DSN")
 
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:4001")
 COURSE_SERVICE_URL = os.getenv("COURSE_SERVICE_URL", "http://localhost:4002")
 WEATHER_SERVICE_URL = os.getenv("WEATHER_SERVICE_URL", "http://localhost:4004")
 
-
-# DB connection helper
-def get_conn():
-    return psycopg2.connect(**DB_CONFIG)
+# weather_snapshot is stored once per (city, time bucket) in weather_snapshots and
+# looked up by reference, one primary-key probe per returned row
+WEATHER_SNAPSHOT_COLUMN = "(SELECT ws.data FROM weather_snapshots ws WHERE ws.id={}weather_id) AS weather_snapshot"
+SESSION_COLUMNS = "id,user_id,course_id,title,start_time,end_time,status,city," + WEATHER_SNAPSHOT_COLUMN.format("")
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+MAX_BULK_SIZE = int(os.getenv("MAX_BULK_SIZE", "1000"))
+# in-process cache of serialized list responses keyed by (query, list version)
+LIST_CACHE_ENABLED = os.getenv("LIST_CACHE_ENABLED", "1") == "1"
+LIST_CACHE_SIZE = int(os.getenv("LIST_CACHE_SIZE", "500"))
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "600"))
+# total size of cached bodies; a body over LIST_CACHE_MAX_ENTRY_BYTES (a large unfiltered
+# or export-sized list) is served but not cached
+LIST_CACHE_MAX_BYTES = int(os.getenv("LIST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LIST_CACHE_MAX_ENTRY_BYTES = int(os.getenv("LIST_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+# reject sessions that overlap another session of the same user (exclusion constraint)
+PREVENT_OVERLAP = os.getenv("PREVENT_OVERLAP", "0") == "1"
+
+# Bulk deletes run as background jobs, one short transaction per chunk
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "1000"))
+DELETE_CHUNK_PAUSE = float(os.getenv("DELETE_CHUNK_PAUSE", "0.05"))
+# a chunk hitting a transient error (busy pool, deadlock, serialization failure) is retried
+# with exponential backoff up to this many seconds between attempts
+DELETE_RETRY_MAX = float(os.getenv("DELETE_RETRY_MAX", "30"))
+
+# Range-partition study_sessions by start_time (an existing table is converted at startup)
+SESSION_PARTITIONING = os.getenv("SESSION_PARTITIONING", "0") == "1"
+SESSION_PARTITION_MONTHS = int(os.getenv("SESSION_PARTITION_MONTHS", "6"))
+SESSION_PARTITION_AHEAD_MONTHS = int(os.getenv("SESSION_PARTITION_AHEAD_MONTHS", "12"))
+SESSION_PARTITION_CHECK_INTERVAL = float(os.getenv("SESSION_PARTITION_CHECK_INTERVAL", "86400"))
+SESSION_ARCHIVE_SCHEMA = "session_archive"
+# detaching needs a brief exclusive lock; give up rather than queue every query behind a long reader
+ARCHIVE_LOCK_TIMEOUT_MS = int(os.getenv("ARCHIVE_LOCK_TIMEOUT_MS", "3000"))
+PARTITION_LOCK = 723003
+# writable columns, for copying rows between tables (period is generated)
+SESSION_STORED_COLUMNS = "id,user_id,course_id,title,start_time,end_time,status,city,weather_id,weather_pending"
+
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE", "500"))
+CHANGES_MAX_WAIT = float(os.getenv("CHANGES_MAX_WAIT", "30"))
+
+# Users and courses are rarely created/deleted, so existence answers are cached.
+# Negative answers expire quickly so a freshly created user/course is seen soon.
+EXISTS_CACHE_SIZE = int(os.getenv("EXISTS_CACHE_SIZE", "10000"))
+EXISTS_CACHE_TTL = float(os.getenv("EXISTS_CACHE_TTL", "300"))
+EXISTS_CACHE_NEGATIVE_TTL = float(os.getenv("EXISTS_CACHE_NEGATIVE_TTL", "10"))
+# when user/course-service can't answer: "stale" uses the last cached answer (else 503),
+# "reject" always answers 503, "allow" assumes the id exists
+EXISTS_FALLBACK = os.getenv("EXISTS_FALLBACK", "stale")
+user_exists_cache = TTLCache(EXISTS_CACHE_SIZE, EXISTS_CACHE_TTL, EXISTS_CACHE_NEGATIVE_TTL)
+course_exists_cache = TTLCache(EXISTS_CACHE_SIZE, EXISTS_CACHE_TTL, EXISTS_CACHE_NEGATIVE_TTL)
+# Local copies of valid ids, fed by user.*/course.* events; ids they don't know
+# (or any id while a replica is stale) are checked remotely as before
+user_replica = IdReplica("user", f"{USER_SERVICE_URL}/internal/users/ids", user_exists_cache)
+course_replica = IdReplica("course", f"{COURSE_SERVICE_URL}/internal/courses/ids", course_exists_cache)
+id_replicas = {"user": user_replica, "course": course_replica}
+
+# Weather per city: fresh entries are served directly, stale ones are served
+# while a background refresh runs, concurrent misses share one upstream fetch
+WEATHER_CACHE_FRESH_TTL = float(os.getenv("WEATHER_CACHE_FRESH_TTL", "300"))
+WEATHER_CACHE_STALE_TTL = float(os.getenv("WEATHER_CACHE_STALE_TTL", "1800"))
+weather_cache = StaleWhileRevalidateCache(WEATHER_CACHE_FRESH_TTL, WEATHER_CACHE_STALE_TTL)
+
+# "inline" fetches weather before inserting; "deferred" inserts with weather_pending set
+# and lets the background worker fill weather_snapshot (one fetch per city)
+WEATHER_MODE = os.getenv("WEATHER_MODE", "inline")
+WEATHER_WORKER_INTERVAL = float(os.getenv("WEATHER_WORKER_INTERVAL", "30"))
+WEATHER_WORKER_BATCH = int(os.getenv("WEATHER_WORKER_BATCH", "1000"))
+WEATHER_REFRESH_DAYS = float(os.getenv("WEATHER_REFRESH_DAYS", "7"))
+# weather-service needs a bearer token; the worker fetches for many users' sessions at once,
+# so it uses this service credential and never a caller's token. Required for deferred mode
+# and for /internal/weather/refresh.
+WEATHER_SERVICE_TOKEN = os.getenv("WEATHER_SERVICE_TOKEN")
+# sessions created within the same bucket share one stored snapshot per city
+WEATHER_BUCKET_MINUTES = int(os.getenv("WEATHER_BUCKET_MINUTES", "60"))
+WEATHER_BUCKET_SQL = f"date_bin(interval '{WEATHER_BUCKET_MINUTES} minutes', timezone('utc', now()), TIMESTAMP '2000-01-01')"
+
+list_cache = TTLCache(LIST_CACHE_SIZE, LIST_CACHE_TTL, maxbytes=LIST_CACHE_MAX_BYTES, sizeof=lambda entry: len(entry[0]))
 
 
 # Initialize DB (create table)
 def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS study_sessions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                course_id INTEGER NOT NULL,
+                title VARCHAR(255) NOT NULL,
+                start_time TIMESTAMP NOT NULL,
+                end_time TIMESTAMP NOT NULL,
+                status VARCHAR(50) NOT NULL DEFAULT 'PLANNED'
+            );
+            """
+        )
+        # Add columns for weather integration if they don't exist
+        cur.execute("ALTER TABLE study_sessions ADD COLUMN IF NOT EXISTS city VARCHAR(100) NOT NULL DEFAULT 'ljubljana';")
+        # Weather snapshots are shared: sessions reference one row per (city, bucket).
+        # bucket is NULL for snapshots migrated from per-session copies (fetch time unknown).
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS weather_snapshots (
+                id BIGSERIAL PRIMARY KEY,
+                city VARCHAR(100) NOT NULL,
+                bucket TIMESTAMP,
+                data JSONB NOT NULL,
+                UNIQUE (city, bucket)
+            );
+            """
+        )
+        cur.execute("ALTER TABLE study_sessions ADD COLUMN IF NOT EXISTS weather_id BIGINT REFERENCES weather_snapshots(id);")
+        cur.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_name='study_sessions' AND column_name='weather_snapshot'"
+        )
+        if cur.fetchone():
+            migrate_weather_snapshots(cur)
+        cur.execute("ALTER TABLE study_sessions ADD COLUMN IF NOT EXISTS weather_pending BOOLEAN NOT NULL DEFAULT false;")
+        # Session interval as a range for overlap checks and free-slot search.
+        # GREATEST keeps legacy rows with end_time < start_time valid (empty range).
+        cur.execute(
+            """
+            ALTER TABLE study_sessions ADD COLUMN IF NOT EXISTS period TSRANGE
+            GENERATED ALWAYS AS (tsrange(start_time, GREATEST(start_time, end_time), '[)')) STORED;
+            """
+        )
+        # Indexes below are created on the partitioned parent, so convert first
+        partitioned = is_partitioned(cur)
+        if SESSION_PARTITIONING and not partitioned:
+            partition_sessions(cur)
+            partitioned = True
+        if partitioned:
+            ensure_partitions(cur)
+        # small partial index: only rows still waiting for the weather worker
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_study_sessions_weather_pending ON study_sessions (id) WHERE weather_pending;")
+        # Range scans for list filters and keyset pagination on (start_time, id)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_study_sessions_start ON study_sessions (start_time, id);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_study_sessions_user_start ON study_sessions (user_id, start_time, id);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_study_sessions_course_start ON study_sessions (course_id, start_time, id);")
+        # btree_gist lets user_id share the GiST index; without it index the range alone
+        cur.execute("SELECT 1 FROM pg_available_extensions WHERE name='btree_gist'")
+        has_btree_gist = cur.fetchone() is not None
+        if has_btree_gist:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gist;")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_study_sessions_user_period ON study_sessions USING gist (user_id, period);")
+        else:
+            print("btree_gist not available, indexing period without user_id")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_study_sessions_period ON study_sessions USING gist (period);")
+        # Per-user list versions for ETags; bumped by every write in the same transaction.
+        # The unfiltered list is versioned by the head of the change log instead: a sequence's
+        # last_value moves at nextval(), before the writer commits.
+        cur.execute("CREATE SEQUENCE IF NOT EXISTS session_version_seq;")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_versions (
+                user_id INTEGER PRIMARY KEY,
+                version BIGINT NOT NULL
+            );
+            """
+        )
+        # Planned/completed totals per (user, course, status), maintained by after_write
+        cur.execute("SELECT to_regclass('session_stats') IS NULL")
+        backfill_stats = cur.fetchone()[0]
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_stats (
+                user_id INTEGER NOT NULL,
+                course_id INTEGER NOT NULL,
+                status VARCHAR(50) NOT NULL,
+                sessions BIGINT NOT NULL DEFAULT 0,
+                seconds BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, course_id, status)
+            );
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_session_stats_course ON session_stats (course_id);")
+        if backfill_stats:
+            cur.execute(
+                """
+                INSERT INTO session_stats (user_id, course_id, status, sessions, seconds)
+                SELECT user_id, course_id, status, count(*),
+                       COALESCE(sum(GREATEST(extract(epoch FROM end_time - start_time), 0)), 0)::bigint
+                FROM study_sessions
+                GROUP BY user_id, course_id, status
+                """
+            )
+        # Transactional outbox: one row per changed session, appended by after_write;
+        # xid is the writing transaction, which decides when the entry is exposed
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_changes (
+                seq BIGSERIAL PRIMARY KEY,
+                op VARCHAR(20) NOT NULL,
+                session_id INTEGER,
+                user_id INTEGER,
+                data JSONB,
+                changed_at TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+                xid xid8 NOT NULL DEFAULT pg_current_xact_id()
+            );
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_changes_state (
+                id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+                pruned_through BIGINT NOT NULL DEFAULT 0,
+                published_through BIGINT NOT NULL DEFAULT 0,
+                pruned_xid xid8 NOT NULL DEFAULT '0',
+                published_xid xid8 NOT NULL DEFAULT '0'
+            );
+            """
+        )
+        cur.execute("INSERT INTO session_changes_state DEFAULT VALUES ON CONFLICT DO NOTHING;")
+        cur.execute("SELECT 1 FROM information_schema.columns WHERE table_name='session_changes' AND column_name='xid'")
+        if not cur.fetchone():
+            # log from before concurrent appends: its entries all get this transaction's xid,
+            # which keeps their seq order, and the pruned/published positions move along
+            cur.execute("ALTER TABLE session_changes ADD COLUMN xid xid8 NOT NULL DEFAULT pg_current_xact_id();")
+            cur.execute("ALTER TABLE session_changes_state ADD COLUMN pruned_xid xid8 NOT NULL DEFAULT '0';")
+            cur.execute("ALTER TABLE session_changes_state ADD COLUMN published_xid xid8 NOT NULL DEFAULT '0';")
+            cur.execute(
+                """
+                UPDATE session_changes_state
+                SET pruned_xid=pg_current_xact_id(), published_xid=CASE WHEN published_through > 0
+                                                                        THEN pg_current_xact_id() ELSE '0' END
+                """
+            )
+        cur.execute("DROP INDEX IF EXISTS idx_session_changes_user;")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_session_changes_xid ON session_changes (xid, seq);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_session_changes_user_xid ON session_changes (user_id, xid, seq);")
+        # Progress of background bulk deletes; max_id bounds a job to rows that existed when it started
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS delete_jobs (
+                id BIGSERIAL PRIMARY KEY,
+                user_id INTEGER,
+                max_id INTEGER NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'running',
+                deleted BIGINT NOT NULL DEFAULT 0,
+                total BIGINT NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+                finished_at TIMESTAMP
+            );
+            """
+        )
+        conn.commit()
+
+        if PREVENT_OVERLAP and partitioned:
+            # an exclusion constraint on a partitioned table would have to include start_time with =
+            print("Overlap constraint is not available on a partitioned study_sessions table")
+        elif PREVENT_OVERLAP and has_btree_gist:
+            cur.execute("SELECT 1 FROM pg_constraint WHERE conname='study_sessions_no_overlap'")
+            if not cur.fetchone():
+                try:
+                    cur.execute(
+                        """
+                        ALTER TABLE study_sessions ADD CONSTRAINT study_sessions_no_overlap
+                        EXCLUDE USING gist (user_id WITH =, period WITH &&);
+                        """
+                    )
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Could not enable overlap constraint (existing overlaps?): {e}")
+        cur.close()
+    print("Study sessions table ensured")
+
+
+# On-disk size of study_sessions with indexes; a partitioned parent has no storage of its
+# own, so this sums its partitions (a plain table is its own single-node tree)
+SESSIONS_TOTAL_BYTES_SQL = "(SELECT COALESCE(sum(pg_total_relation_size(relid)), 0)::bigint FROM pg_partition_tree('study_sessions'))"
+
+
+def weather_storage(cur) -> dict:
+    """Row counts and on-disk sizes of sessions and their weather snapshots"""
+    cur.execute(
+        f"""
+        SELECT (SELECT count(*) FROM study_sessions),
+               (SELECT count(*) FROM study_sessions WHERE weather_id IS NOT NULL),
+               (SELECT count(*) FROM weather_snapshots),
+               (SELECT COALESCE(sum(pg_column_size(data)), 0) FROM weather_snapshots),
+               {SESSIONS_TOTAL_BYTES_SQL},
+               pg_total_relation_size('weather_snapshots')
+        """
+    )
+    sessions, referencing, snapshots, snapshot_bytes, sessions_total, snapshots_total = cur.fetchone()
+    return {
+        "sessions": sessions,
+        "sessions_with_weather": referencing,
+        "snapshots": snapshots,
+        # weather payload bytes: shared snapshots plus the 8-byte reference per session
+        "weather_bytes": int(snapshot_bytes) + 8 * referencing,
+        "study_sessions_total_bytes": sessions_total,
+        "weather_snapshots_total_bytes": snapshots_total,
+    }
+
+
+def migrate_weather_snapshots(cur):
+    """Move per-row weather_snapshot copies into weather_snapshots, one per distinct (city, payload),
+    point sessions at them and drop the old column; prints a before/after size report"""
+    cur.execute(
+        f"""
+        SELECT count(*), COALESCE(sum(pg_column_size(weather_snapshot)), 0), {SESSIONS_TOTAL_BYTES_SQL}
+        FROM study_sessions WHERE weather_snapshot IS NOT NULL
+        """
+    )
+    copies, inline_bytes, sessions_total = cur.fetchone()
+    cur.execute(
+        """
+        INSERT INTO weather_snapshots (city, bucket, data)
+        SELECT lower(trim(city)), NULL, weather_snapshot
+        FROM study_sessions WHERE weather_snapshot IS NOT NULL
+        GROUP BY lower(trim(city)), weather_snapshot
+        """
+    )
+    cur.execute(
+        """
+        UPDATE study_sessions s SET weather_id=ws.id
+        FROM weather_snapshots ws
+        WHERE s.weather_snapshot IS NOT NULL AND ws.bucket IS NULL
+          AND ws.city=lower(trim(s.city)) AND ws.data=s.weather_snapshot
+        """
+    )
+    cur.execute("ALTER TABLE study_sessions DROP COLUMN weather_snapshot;")
+    after = weather_storage(cur)
+    print(
+        f"[Weather] Migrated {copies} inline snapshots into {after['snapshots']} shared ones: "
+        f"weather bytes {int(inline_bytes)} -> {after['weather_bytes']}, "
+        f"study_sessions {sessions_total} bytes before migration "
+        f"(dropped column space is reused by new rows, VACUUM FULL study_sessions returns it now)"
+    )
+
+
+def store_snapshots(cur, weather_by_city: dict) -> dict:
+    """Snapshot ids for {city: weather} in the current bucket; the first fetch stored in a bucket wins"""
+    weather_by_city = {normalize_city(c): w for c, w in weather_by_city.items() if w}
+    if not weather_by_city:
+        return {}
+    execute_values(
+        cur,
+        f"""
+        INSERT INTO weather_snapshots (city, bucket, data)
+        SELECT v.city, {WEATHER_BUCKET_SQL}, v.data::jsonb FROM (VALUES %s) AS v(city, data)
+        ON CONFLICT (city, bucket) DO NOTHING
+        """,
+        [(c, Json(w)) for c, w in sorted(weather_by_city.items())],
+    )
+    cur.execute(
+        f"SELECT city, id FROM weather_snapshots WHERE city = ANY(%s) AND bucket = {WEATHER_BUCKET_SQL}",
+        (sorted(weather_by_city),),
+    )
+    return dict(cur.fetchall())
+
+
+def is_partitioned(cur) -> bool:
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid='study_sessions'::regclass")
+    return cur.fetchone()[0]
+
+
+def partition_start(ts: datetime) -> datetime:
+    """Lower bound of the partition range holding ts (ranges are aligned to whole months)"""
+    months = ts.year * 12 + ts.month - 1
+    months -= months % SESSION_PARTITION_MONTHS
+    return datetime(months // 12, months % 12 + 1, 1)
+
+
+def add_months(ts: datetime, months: int) -> datetime:
+    total = ts.year * 12 + ts.month - 1 + months
+    return datetime(total // 12, total % 12 + 1, 1)
+
+
+def create_partition(cur, lower: datetime, upper: datetime):
+    """Attach a range partition; rows of that range already in the default partition move into it"""
+    name = f"study_sessions_p{lower:%Y_%m}"
+    cur.execute(
+        "SELECT EXISTS (SELECT 1 FROM study_sessions_default WHERE start_time >= %s AND start_time < %s)",
+        (lower, upper),
+    )
+    moving = cur.fetchone()[0]
+    if moving:
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE moving_sessions ON COMMIT DROP AS
+            SELECT {SESSION_STORED_COLUMNS} FROM study_sessions_default WHERE start_time >= %s AND start_time < %s
+            """,
+            (lower, upper),
+        )
+        cur.execute("DELETE FROM study_sessions_default WHERE start_time >= %s AND start_time < %s", (lower, upper))
+    cur.execute(f"CREATE TABLE {name} PARTITION OF study_sessions FOR VALUES FROM (%s) TO (%s)", (lower, upper))
+    if moving:
+        cur.execute(f"INSERT INTO study_sessions ({SESSION_STORED_COLUMNS}) SELECT * FROM moving_sessions")
+        cur.execute("DROP TABLE moving_sessions")
+    print(f"Created partition {name} [{lower:%Y-%m-%d}, {upper:%Y-%m-%d})")
+
+
+def ensure_partitions(cur, oldest: Optional[datetime] = None):
+    """Make sure ranges from `oldest` (default: now) to SESSION_PARTITION_AHEAD_MONTHS ahead have partitions.
+
+    Earlier ranges are left alone so archived terms are not recreated; sessions
+    outside every range land in study_sessions_default.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK,))
+    cur.execute("CREATE TABLE IF NOT EXISTS study_sessions_default PARTITION OF study_sessions DEFAULT")
+    cur.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent='study_sessions'::regclass")
+    existing = {r[0] for r in cur.fetchall()}
+    now = datetime.now()
+    lower = partition_start(min(oldest, now) if oldest else now)
+    last = add_months(now, SESSION_PARTITION_AHEAD_MONTHS)
+    while lower <= last:
+        upper = add_months(lower, SESSION_PARTITION_MONTHS)
+        if f"study_sessions_p{lower:%Y_%m}" not in existing:
+            create_partition(cur, lower, upper)
+        lower = upper
+
+
+def partition_sessions(cur):
+    """Replace the plain study_sessions table with one range-partitioned by start_time"""
+    started = time.monotonic()
+    cur.execute("LOCK TABLE study_sessions IN ACCESS EXCLUSIVE MODE")
+    cur.execute("SELECT pg_get_serial_sequence('study_sessions', 'id')")
+    id_sequence = cur.fetchone()[0]
+    cur.execute("ALTER TABLE study_sessions RENAME TO study_sessions_unpartitioned")
+    cur.execute("ALTER INDEX IF EXISTS study_sessions_pkey RENAME TO study_sessions_unpartitioned_pkey")
+    # the primary key of a partitioned table has to include the partition key
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS study_sessions (
-            id SERIAL PRIMARY KEY,
+        CREATE TABLE study_sessions (
+            id INTEGER NOT NULL DEFAULT nextval(%s::regclass),
             user_id INTEGER NOT NULL,
             course_id INTEGER NOT NULL,
             title VARCHAR(255) NOT NULL,
             start_time TIMESTAMP NOT NULL,
             end_time TIMESTAMP NOT NULL,
-            status VARCHAR(50) NOT NULL DEFAULT 'PLANNED'
-        );
+            status VARCHAR(50) NOT NULL DEFAULT 'PLANNED',
+            city VARCHAR(100) NOT NULL DEFAULT 'ljubljana',
+            weather_id BIGINT REFERENCES weather_snapshots(id),
+            weather_pending BOOLEAN NOT NULL DEFAULT false,
+            period TSRANGE GENERATED ALWAYS AS (tsrange(start_time, GREATEST(start_time, end_time), '[)')) STORED,
+            PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+        """,
+        (id_sequence,),
+    )
+    cur.execute("SELECT min(start_time) FROM study_sessions_unpartitioned")
+    ensure_partitions(cur, cur.fetchone()[0])
+    cur.execute(
+        f"INSERT INTO study_sessions ({SESSION_STORED_COLUMNS}) "
+        f"SELECT {SESSION_STORED_COLUMNS} FROM study_sessions_unpartitioned"
+    )
+    moved = cur.rowcount
+    cur.execute(f"ALTER SEQUENCE {id_sequence} OWNED BY study_sessions.id")
+    cur.execute("DROP TABLE study_sessions_unpartitioned")
+    print(f"Partitioned study_sessions by start_time: {moved} rows moved in {time.monotonic() - started:.1f}s")
+
+
+def bump_versions(cur, user_ids):
+    """Invalidate cached lists of the given users"""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    # sorted ids keep row-lock order stable across concurrent writers
+    cur.execute(
         """
+        INSERT INTO session_versions (user_id, version)
+        SELECT u, nextval('session_version_seq') FROM unnest(%s::int[]) AS u
+        ON CONFLICT (user_id) DO UPDATE SET version=EXCLUDED.version
+        """,
+        (user_ids,),
+    )
+
+
+def apply_stats(cur, old_rows=(), new_rows=()):
+    """Move old rows out of and new rows into the session_stats totals"""
+    deltas = {}
+    for sign, rows in ((-1, old_rows), (1, new_rows)):
+        for r in rows:
+            key = (r[1], r[2], r[6])
+            seconds = max(int((r[5] - r[4]).total_seconds()), 0)
+            count, total = deltas.get(key, (0, 0))
+            deltas[key] = (count + sign, total + sign * seconds)
+    values = [(*key, count, total) for key, (count, total) in sorted(deltas.items()) if count or total]
+    add_stats(cur, values)
+
+
+def add_stats(cur, values: list):
+    """Add (user_id, course_id, status, sessions, seconds) deltas to session_stats"""
+    if not values:
+        return
+    execute_values(
+        cur,
+        """
+        INSERT INTO session_stats (user_id, course_id, status, sessions, seconds)
+        VALUES %s
+        ON CONFLICT (user_id, course_id, status) DO UPDATE
+        SET sessions=session_stats.sessions + EXCLUDED.sessions,
+            seconds=session_stats.seconds + EXCLUDED.seconds
+        """,
+        values,
+        page_size=len(values),
     )
-    # Add columns for weather integration if they don't exist
-    cur.execute("ALTER TABLE study_sessions ADD COLUMN IF NOT EXISTS city VARCHAR(100) NOT NULL DEFAULT 'ljubljana';")
-    cur.execute("ALTER TABLE study_sessions ADD COLUMN IF NOT EXISTS weather_snapshot JSONB;")
-    conn.commit()
-    cur.close()
-    conn.close()
-    print("Study sessions table ensured")
+
+
+def after_write(cur, old_rows=(), new_rows=()):
+    """Keep derived state in step with a write to study_sessions, in the same transaction.
+
+    old_rows/new_rows are SESSION_COLUMNS tuples before and after the write.
+    """
+    owners = [r[1] for r in old_rows] + [r[1] for r in new_rows]
+    bump_versions(cur, owners)
+    apply_stats(cur, old_rows, new_rows)
+    note_write(owners)
+    changes = []
+    before = {r[0]: r for r in old_rows}
+    for r in new_rows:
+        old = before.pop(r[0], None)
+        if old == r:
+            continue
+        if old is not None and old[1] != r[1]:
+            # moved to another user: a delete in the old user's feed, an insert in the new one's
+            changes.append(("delete", r[0], old[1], None))
+            old = None
+        changes.append(("insert" if old is None else "update", r[0], r[1], orjson.dumps(session_dict(r)).decode()))
+    changes.extend(("delete", r[0], r[1], None) for r in before.values())
+    record_changes(cur, changes)
+
+
+def record_changes(cur, changes: list):
+    """Append (op, session_id, user_id, json) entries to the change log.
+
+    Appends don't wait on each other; readers only expose entries of transactions older
+    than every one still running (CHANGES_VISIBLE), so nothing can appear behind a cursor.
+    """
+    if not changes:
+        return
+    execute_values(
+        cur,
+        "INSERT INTO session_changes (op, session_id, user_id, data) VALUES %s",
+        changes,
+        template="(%s, %s, %s, %s::jsonb)",
+        page_size=len(changes),
+    )
+
+
+def qualified_columns(alias: str) -> str:
+    plain = SESSION_COLUMNS.split(",")[:8]
+    return ",".join(f"{alias}.{c}" for c in plain) + "," + WEATHER_SNAPSHOT_COLUMN.format(f"{alias}.")
+
+
+# Version of the unfiltered list in the current snapshot: the last exposed change-log entry
+# plus how many newer ones are already committed. Every commit changes one of the two: it
+# either lands among the newer ones or, once exposed, moves the end of the exposed log.
+LOG_VERSION_SQL = f"""
+    SELECT ({CHANGES_END_SQL})[2] || '.' ||
+           (SELECT count(*) FROM session_changes WHERE NOT ({CHANGES_VISIBLE}))
+"""
+
+
+def list_version(cur, user_id: Optional[int]):
+    if user_id:
+        cur.execute("SELECT version FROM session_versions WHERE user_id=%s", (user_id,))
+    else:
+        cur.execute(LOG_VERSION_SQL)
+    row = cur.fetchone()
+    return row[0] if row else 0
 
 
 # Pydantic models
@@ -180,240 +774,1212 @@ class StudySessionOut(StudySessionIn):
     weather_snapshot: Optional[dict] = None
 
 
-# Helpers to check remote services
-def user_exists(user_id: int, token: Optional[str] = None) -> bool:
-    try:
-        r = requests.get(f"{USER_SERVICE_URL}/internal/users/{user_id}/exists", timeout=2)
-        return r.status_code == 200 and r.json().get('exists') == True
-    except:
-        return False
+class BulkSessionsIn(BaseModel):
+    sessions: List[StudySessionIn]
 
 
-def course_exists(course_id: int, token: Optional[str] = None) -> bool:
-    try:
-        r = requests.get(f"{COURSE_SERVICE_URL}/internal/courses/{course_id}/exists", timeout=2)
-        return r.status_code == 200 and r.json().get('exists') == True
-    except:
-        return False
+class BatchCompleteIn(BaseModel):
+    ids: List[int]
+
+
+class RescheduleItem(BaseModel):
+    id: int
+    new_start: str  # ISO string
+    new_end: str    # ISO string
+
+
+class BatchRescheduleIn(BaseModel):
+    items: List[RescheduleItem]
 
 
-def get_weather_for_location(city: str = "ljubljana", token: Optional[str] = None) -> Optional[dict]:
-    """Fetch weather data from weather-service for a given city"""
+# Helpers to check remote services
+async def fetch_exists(url: str, service: str) -> Optional[bool]:
+    """Ask an /internal/.../exists endpoint; None means the answer is unknown (error or breaker open)"""
+    breaker = breakers[service]
+    if not breaker.allow():
+        return None
+    start_time = time.perf_counter()
+    exists = None
+    try:
+        r = await get_http_client().get(url)
+        if r.status_code == 200:
+            exists = r.json().get('exists') == True
+        elif r.status_code == 404:
+            exists = False
+    except Exception:
+        pass
+    finally:
+        # also on cancellation, or a half-open probe would hold the breaker half open for good
+        breaker.record(exists is not None)
+        prometheus.observe_downstream(service, time.perf_counter() - start_time, exists is not None)
+    return exists
+
+
+async def cached_exists(cache: TTLCache, key: int, url: str, service: str) -> bool:
+    exists = cache.get(key)
+    if exists is not MISSING:
+        return exists
+    with span("exists"):
+        exists = await fetch_exists(url, service)
+    if exists is None:
+        # don't cache transport errors as "does not exist"
+        return exists_fallback(cache, key, service)
+    cache.set(key, exists)
+    return exists
+
+
+def exists_fallback(cache: TTLCache, key: int, service: str) -> bool:
+    if EXISTS_FALLBACK == "allow":
+        return True
+    if EXISTS_FALLBACK == "stale":
+        exists = cache.get_stale(key)
+        if exists is not MISSING:
+            return exists
+    raise DownstreamUnavailable(service, breakers[service].retry_after())
+
+
+async def user_exists(user_id: int, token: Optional[str] = None) -> bool:
+    if user_replica.contains(user_id):
+        return True
+    return await cached_exists(user_exists_cache, user_id, f"{USER_SERVICE_URL}/internal/users/{user_id}/exists", "user")
+
+
+async def course_exists(course_id: int, token: Optional[str] = None) -> bool:
+    if course_replica.contains(course_id):
+        return True
+    return await cached_exists(course_exists_cache, course_id, f"{COURSE_SERVICE_URL}/internal/courses/{course_id}/exists", "course")
+
+
+def normalize_city(city: Optional[str]) -> str:
+    return (city or "ljubljana").strip().lower()
+
+
+async def get_weather_for_location(city: str = "ljubljana", token: Optional[str] = None, correlation_id: Optional[str] = None) -> Optional[dict]:
+    """Weather for a city, served from the per-city cache"""
+    city = normalize_city(city)
+    with span("weather"):
+        return await weather_cache.get(city, lambda: fetch_weather(city, token, correlation_id))
+
+
+async def fetch_weather(city: str, token: Optional[str] = None, correlation_id: Optional[str] = None) -> Optional[dict]:
+    """Fetch weather data from weather-service for a given city; None (no snapshot) while its breaker is open"""
+    breaker = breakers["weather"]
+    if not breaker.allow():
+        return None
+    start_time = time.perf_counter()
+    ok = False
     try:
         headers = {}
+        if correlation_id:
+            headers['x-correlation-id'] = correlation_id
         if token:
             headers['Authorization'] = f'Bearer {token}'
-        
-        r = requests.get(f"{WEATHER_SERVICE_URL}/weather/{city}", headers=headers, timeout=2)
+
+        r = await get_http_client().get(f"{WEATHER_SERVICE_URL}/weather/{city}", headers=headers)
+        ok = r.status_code < 500
         if r.status_code == 200:
             return r.json()
         return None
     except Exception as e:
-        print(f"Failed to fetch weather: {e}")
+        print(f"Failed to fetch weather for {city}: {e}")
         return None
+    finally:
+        # also on cancellation, so a half-open probe always resolves
+        breaker.record(ok)
+        prometheus.observe_downstream("weather", time.perf_counter() - start_time, ok)
+
+
+# Deferred weather enrichment: study_sessions.weather_pending is the queue, the event
+# only wakes the worker early, so pending rows survive restarts
+weather_worker_wakeup = None
+weather_worker_task = None
+weather_worker_stats = {"filled": 0, "failed_cities": 0, "runs": 0}
+
+
+def pending_weather_batch(skip_cities=()) -> list:
+    """Up to WEATHER_WORKER_BATCH pending session ids for every pending city not in skip_cities"""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        # per-city limit, so a backlog in one city can't crowd the others out of the batch
+        cur.execute(
+            """
+            SELECT c.city, p.ids
+            FROM (SELECT DISTINCT lower(trim(COALESCE(city, 'ljubljana'))) AS city
+                  FROM study_sessions WHERE weather_pending) c
+            CROSS JOIN LATERAL (
+                SELECT array_agg(id ORDER BY id) AS ids FROM (
+                    SELECT id FROM study_sessions
+                    WHERE weather_pending AND lower(trim(COALESCE(city, 'ljubljana'))) = c.city
+                    ORDER BY id LIMIT %s
+                ) s
+            ) p
+            WHERE c.city <> ALL(%s)
+            """,
+            (WEATHER_WORKER_BATCH, list(skip_cities)),
+        )
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+def fill_weather(city: str, ids: List[int], weather_data: dict) -> int:
+    with get_conn() as conn:
+        cur = conn.cursor()
+        old_rows = lock_sessions(cur, ids)
+        weather_id = store_snapshots(cur, {city: weather_data})[normalize_city(city)]
+        cur.execute(
+            f"""
+            UPDATE study_sessions SET weather_id=%s, weather_pending=false
+            WHERE id = ANY(%s) AND weather_pending
+            RETURNING {SESSION_COLUMNS}
+            """,
+            (weather_id, list(ids)),
+        )
+        updated = cur.fetchall()
+        filled = {r[0] for r in updated}
+        after_write(cur, [r for r in old_rows if r[0] in filled], updated)
+        conn.commit()
+        cur.close()
+    return len(updated)
+
+
+async def enrich_pending_weather():
+    """Fill weather_snapshot of pending sessions, one fetch per city; cities whose fetch fails stay pending"""
+    if not WEATHER_SERVICE_TOKEN:
+        return
+    # cities that can't be filled this run are left out of its later batches
+    skipped = set()
+    while True:
+        batch = await run_in_threadpool(pending_weather_batch, skipped)
+        more = False
+        for city, ids in batch:
+            weather_data = await get_weather_for_location(city, token=WEATHER_SERVICE_TOKEN)
+            if not weather_data:
+                weather_worker_stats["failed_cities"] += 1
+                skipped.add(city)
+                continue
+            filled = await run_in_threadpool(fill_weather, city, ids, weather_data)
+            weather_worker_stats["filled"] += filled
+            # a full batch with progress may have more behind it
+            more = more or (filled and len(ids) >= WEATHER_WORKER_BATCH)
+        if not more:
+            return
+
+
+async def weather_worker():
+    while True:
+        try:
+            await asyncio.wait_for(weather_worker_wakeup.wait(), timeout=WEATHER_WORKER_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        weather_worker_wakeup.clear()
+        weather_worker_stats["runs"] += 1
+        try:
+            await enrich_pending_weather()
+        except Exception as e:
+            print(f"[Weather] Enrichment run failed: {e}")
+
+
+def wake_weather_worker():
+    if weather_worker_wakeup is not None:
+        weather_worker_wakeup.set()
+
+
+# Background delete jobs by id, and upkeep creating partitions ahead of time
+delete_tasks = {}
+partition_worker_task = None
+
+
+def maintain_partitions():
+    with get_conn() as conn:
+        cur = conn.cursor()
+        if is_partitioned(cur):
+            ensure_partitions(cur)
+        conn.commit()
+        cur.close()
+
+
+async def partition_worker():
+    while True:
+        await asyncio.sleep(SESSION_PARTITION_CHECK_INTERVAL)
+        try:
+            await run_in_threadpool(maintain_partitions)
+        except Exception as e:
+            print(f"[Partitions] Upkeep failed: {e}")
 
 
 @app.on_event("startup")
 async def startup_event():
+    if WEATHER_MODE == "deferred" and not WEATHER_SERVICE_TOKEN:
+        raise RuntimeError("WEATHER_MODE=deferred requires WEATHER_SERVICE_TOKEN for the weather worker")
+    if not WEATHER_SERVICE_TOKEN:
+        print("[Weather] WEATHER_SERVICE_TOKEN not set, /internal/weather/refresh is disabled")
+    initialize_pool(DB_CONFIG)
+    if DB_REPLICA_DSN:
+        initialize_read_pool({"dsn": DB_REPLICA_DSN})
     init_db()
     initialize_logger()
+    initialize_http_client()
+    if METRICS_ENABLED:
+        metrics_aggregator.start()
+    global weather_worker_wakeup, weather_worker_task
+    weather_worker_wakeup = asyncio.Event()
+    weather_worker_task = asyncio.create_task(weather_worker())
+    start_replicas(id_replicas)
+    start_change_feed(DB_CONFIG)
+    global partition_worker_task
+    partition_worker_task = asyncio.create_task(partition_worker())
+    # jobs interrupted by a restart pick up where their last chunk committed
+    for job_id, user_id, max_id in running_delete_jobs():
+        spawn_delete_job(job_id, user_id, max_id)
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if weather_worker_task is not None:
+        weather_worker_task.cancel()
+    if partition_worker_task is not None:
+        partition_worker_task.cancel()
+    for task in list(delete_tasks.values()):
+        task.cancel()
+    stop_replicas()
+    stop_change_feed()
+    close_pool()
+    await metrics_aggregator.stop()
+    await close_http_client()
     close_logger()
 
 
+# Pool exhaustion is a transient overload, not a server bug
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    log_error(request.url.path, request.state.correlation_id, f"Database pool exhausted: {str(exc)}")
+    return JSONResponse(status_code=503, content={"detail": "Database busy, try again"})
+
+
+@app.exception_handler(ExclusionViolation)
+async def overlap_handler(request: Request, exc: ExclusionViolation):
+    log_error(request.url.path, request.state.correlation_id, "Study session overlaps an existing session")
+    return JSONResponse(status_code=409, content={"detail": "Session overlaps an existing session"})
+
+
+# A downstream service is down and there is no fallback answer: fail fast instead of waiting on it
+@app.exception_handler(DownstreamUnavailable)
+async def downstream_unavailable_handler(request: Request, exc: DownstreamUnavailable):
+    log_error(request.url.path, request.state.correlation_id, f"{str(exc)}, failing fast")
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))}
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
+
 # Health endpoint - public (no auth required)
 @app.get("/healthz")
 def healthz(request: Request):
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT 1")
-        cur.close()
-        conn.close()
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
         log_info(request.url.path, request.state.correlation_id, "Health check passed")
-        return {"status": "ok"}
+        # open breakers degrade writes but the service can still answer, so this stays 200
+        states = {name: b.state for name, b in breakers.items()}
+        return {"status": "degraded" if OPEN in states.values() else "ok", "breakers": states}
     except Exception as e:
         log_error(request.url.path, request.state.correlation_id, f"Health check failed: {str(e)}")
         raise HTTPException(status_code=503, detail=f"unavailable: {str(e)}")
 
 
-# ========== GET ENDPOINTS ==========
+# Connection pool stats - public like healthz, for monitoring
+@app.get("/internal/db-pool")
+def db_pool_stats():
+    return pool_stats()
 
-@app.get("/study-sessions", response_model=List[StudySessionOut])
-def list_sessions(request: Request, user_id: Optional[int] = None, current_user=Depends(get_current_user)):
-    conn = get_conn()
-    cur = conn.cursor()
 
-    if user_id:
-        log_info(request.url.path, request.state.correlation_id, f"Fetching study sessions for user_id: {user_id}")
+# Where reads went (replica or primary, and why) plus replica lag
+@app.get("/internal/read-routing")
+def read_routing():
+    return read_routing_stats()
+
+
+# Metrics shipping stats
+@app.get("/internal/metrics-buffer")
+def metrics_buffer_stats():
+    return metrics_aggregator.stats()
+
+
+# Downstream circuit breakers
+@app.get("/internal/breakers")
+def circuit_breaker_stats():
+    return breaker_stats()
+
+
+# Deferred weather enrichment: worker stats and a bulk refresh for upcoming sessions
+@app.get("/internal/weather")
+def weather_worker_status():
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT count(*) FROM study_sessions WHERE weather_pending")
+        pending = cur.fetchone()[0]
+        cur.close()
+    return {"mode": WEATHER_MODE, "pending": pending, **weather_worker_stats}
+
+
+def mark_weather_pending(days: float, city: Optional[str]) -> list:
+    """Flag upcoming sessions for the weather worker; returns the normalized city of each"""
+    with get_conn() as conn:
+        cur = conn.cursor()
         cur.execute(
             """
-            SELECT id,user_id,course_id,title,start_time,end_time,status,city,weather_snapshot
-            FROM study_sessions
-            WHERE user_id=%s
-            ORDER BY start_time
+            UPDATE study_sessions SET weather_pending=true
+            WHERE start_time >= now() AND start_time < now() + %(days)s * interval '1 day'
+              AND status <> 'COMPLETED'
+              AND (%(city)s::text IS NULL OR lower(trim(COALESCE(city, 'ljubljana'))) = %(city)s)
+            RETURNING lower(trim(COALESCE(city, 'ljubljana')))
             """,
-            (user_id,),
+            {"days": days, "city": normalize_city(city) if city else None},
+        )
+        rows = cur.fetchall()
+        conn.commit()
+        cur.close()
+    return [r[0] for r in rows]
+
+
+@app.get("/internal/weather/storage")
+def weather_storage_report():
+    with get_conn() as conn:
+        cur = conn.cursor()
+        report = weather_storage(cur)
+        cur.close()
+    return report
+
+
+@app.post("/internal/weather/refresh")
+async def refresh_weather(request: Request, days: float = Query(WEATHER_REFRESH_DAYS, gt=0), city: Optional[str] = None,
+                          current_user=Depends(get_current_user)):
+    """Re-fetch weather for sessions starting within `days`: mark them pending, drop the cached
+    snapshots of their cities and wake the worker"""
+    if not WEATHER_SERVICE_TOKEN:
+        # the worker would have nothing to fetch with and the rows would stay pending
+        raise HTTPException(status_code=503, detail="Weather refresh needs WEATHER_SERVICE_TOKEN")
+    marked = await run_in_threadpool(mark_weather_pending, days, city)
+    cities = sorted(set(marked))
+    for c in cities:
+        weather_cache.invalidate(c)
+    wake_weather_worker()
+    log_info(request.url.path, request.state.correlation_id, f"Marked {len(marked)} upcoming sessions for weather refresh")
+    return {"marked": len(marked), "cities": cities}
+
+
+# Local user/course id replicas (size, freshness, local hits vs remote checks)
+@app.get("/internal/replica")
+def id_replica_stats():
+    return replica_stats(id_replicas)
+
+
+# Change feed state (listener, relay leader, published entries)
+@app.get("/internal/changes")
+def change_feed_status():
+    return change_feed_stats()
+
+
+def partition_report() -> dict:
+    with get_conn() as conn:
+        cur = conn.cursor()
+        if not is_partitioned(cur):
+            cur.close()
+            return {"partitioned": False}
+        cur.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint,
+                   pg_total_relation_size(c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid=i.inhrelid
+            WHERE i.inhparent='study_sessions'::regclass
+            ORDER BY c.relname
+            """
+        )
+        partitions = [{"name": r[0], "bounds": r[1], "rows_estimate": r[2], "bytes": r[3]} for r in cur.fetchall()]
+        cur.execute(
+            """
+            SELECT c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+            FROM pg_class c JOIN pg_namespace n ON n.oid=c.relnamespace
+            WHERE n.nspname=%s AND c.relkind='r'
+            ORDER BY c.relname
+            """,
+            (SESSION_ARCHIVE_SCHEMA,),
+        )
+        archived = [{"name": f"{SESSION_ARCHIVE_SCHEMA}.{r[0]}", "rows_estimate": r[1], "bytes": r[2]} for r in cur.fetchall()]
+        cur.close()
+    return {"partitioned": True, "months": SESSION_PARTITION_MONTHS, "partitions": partitions, "archived": archived}
+
+
+PARTITION_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def archive_partition(name: str) -> dict:
+    """Detach an ended range into the archive schema; its sessions leave the API, stats and lists"""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid=i.inhrelid
+            WHERE i.inhparent='study_sessions'::regclass AND c.relname=%s
+            """,
+            (name,),
+        )
+        row = cur.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Partition not found")
+        bounds = PARTITION_BOUNDS.search(row[0])
+        if not bounds:
+            raise HTTPException(status_code=409, detail="The default partition can't be archived")
+        lower, upper = (datetime.fromisoformat(b) for b in bounds.groups())
+        if upper > datetime.now():
+            raise HTTPException(status_code=409, detail="Only ranges that have ended can be archived")
+        table = quote_ident(name, cur)
+        cur.execute("SELECT set_config('lock_timeout', %s, true)", (f"{ARCHIVE_LOCK_TIMEOUT_MS}ms",))
+        # writes to the range wait until it is detached, so the totals below stay exact
+        cur.execute(f"LOCK TABLE {table} IN SHARE MODE")
+        cur.execute(
+            f"""
+            SELECT user_id, course_id, status, -count(*),
+                   -COALESCE(sum(GREATEST(extract(epoch FROM end_time - start_time), 0)), 0)::bigint
+            FROM {table}
+            GROUP BY user_id, course_id, status
+            """
         )
+        removed = cur.fetchall()
+        add_stats(cur, removed)
+        users = sorted({r[0] for r in removed})
+        bump_versions(cur, users)
+        note_write(users)
+        cur.execute(f"ALTER TABLE study_sessions DETACH PARTITION {table}")
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {SESSION_ARCHIVE_SCHEMA}")
+        cur.execute(f"ALTER TABLE {table} SET SCHEMA {SESSION_ARCHIVE_SCHEMA}")
+        # one marker instead of a delete per session: followers drop what starts in [from, to)
+        record_changes(cur, [("archive", None, None, orjson.dumps({"partition": name, "from": lower, "to": upper}).decode())])
+        conn.commit()
+        cur.close()
+    return {
+        "partition": name,
+        "archived_as": f"{SESSION_ARCHIVE_SCHEMA}.{name}",
+        "from": lower.isoformat(),
+        "to": upper.isoformat(),
+        "sessions": -sum(r[3] for r in removed),
+        "users": len(users),
+    }
+
+
+# study_sessions partitions by start_time, and ranges already archived
+@app.get("/internal/partitions")
+def session_partitions():
+    return partition_report()
+
+
+@app.post("/internal/partitions/{name}/archive")
+def archive_session_partition(request: Request, name: str, current_user=Depends(get_current_user)):
+    try:
+        result = archive_partition(name)
+    except LockNotAvailable:
+        raise HTTPException(status_code=409, detail="Sessions table is busy, retry the archive later")
+    log_info(request.url.path, request.state.correlation_id,
+             f"Archived partition {name}: {result['sessions']} sessions of {result['users']} users")
+    return result
+
+
+# Log shipping stats (queue depth, dropped/published lines)
+@app.get("/internal/logger")
+def log_shipper_stats():
+    return logger_stats()
+
+
+# Prometheus scrape endpoint; pool and logger gauges are read at scrape time
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    pool = pool_stats()
+    logs = logger_stats()
+    breakers_now = breaker_stats()
+    reads = read_routing_stats()
+    body = prometheus.render([
+        prometheus.collected("planner_db_pool_connections", "Pooled connections by state",
+                             {("in_use",): pool.get("in_use", 0), ("idle",): pool.get("idle", 0)}, ("state",)),
+        prometheus.collected("planner_db_pool_max_connections", "Pool size limit", {(): pool.get("max", 0)}),
+        prometheus.collected("planner_db_pool_waiting", "Requests waiting for a connection",
+                             {(): pool.get("waiting", 0)}),
+        prometheus.collected("planner_db_pool_timeouts_total", "Connection acquire timeouts",
+                             {(): pool.get("timeouts", 0)}, metric_type="counter"),
+        prometheus.collected("planner_db_reads_total", "Read-only queries by where they were routed",
+                             {(route,): n for route, n in reads.get("routed", {}).items()}, ("route",), "counter"),
+        prometheus.collected("planner_db_replica_lag_seconds", "Last measured replica replay lag",
+                             {(): reads["lag_s"]} if reads.get("lag_s") is not None else {}),
+        prometheus.collected("planner_circuit_breaker_state", "Breaker state per service (0 closed, 1 half-open, 2 open)",
+                             {(name,): STATE_CODES[b["state"]] for name, b in breakers_now.items()}, ("service",)),
+        prometheus.collected("planner_circuit_breaker_rejected_total", "Calls short-circuited by an open breaker",
+                             {(name,): b["rejected"] for name, b in breakers_now.items()}, ("service",), "counter"),
+        prometheus.collected("planner_log_queue_depth", "Log lines waiting for RabbitMQ", {(): logs["queue_depth"]}),
+        prometheus.collected("planner_log_lines_total", "Log lines by outcome",
+                             {(k,): logs[k] for k in ("published", "dropped", "spilled")}, ("outcome",), "counter"),
+    ])
+    return PlainTextResponse(body, media_type=prometheus.CONTENT_TYPE)
+
+
+# Rolling per-route, per-phase latency percentiles from sampled requests
+@app.get("/internal/perf")
+def perf_stats():
+    return perf_aggregator.report()
+
+
+@app.delete("/internal/perf")
+def reset_perf_stats(current_user=Depends(get_current_user)):
+    perf_aggregator.reset()
+    return {"message": "Perf samples cleared"}
+
+
+# Existence cache stats and invalidation hooks (e.g. after a user/course is deleted)
+@app.get("/internal/cache")
+def cache_stats():
+    return {
+        "users": user_exists_cache.stats(),
+        "courses": course_exists_cache.stats(),
+        "weather": weather_cache.stats(),
+        "jwt": jwt_cache.stats(),
+        "lists": list_cache.stats(),
+    }
+
+
+@app.delete("/internal/cache/users/{user_id}")
+def invalidate_user_cache(user_id: int, current_user=Depends(get_current_user)):
+    user_exists_cache.invalidate(user_id)
+    return {"message": "User cache entry invalidated"}
+
+
+@app.delete("/internal/cache/courses/{course_id}")
+def invalidate_course_cache(course_id: int, current_user=Depends(get_current_user)):
+    course_exists_cache.invalidate(course_id)
+    return {"message": "Course cache entry invalidated"}
+
+
+@app.delete("/internal/cache")
+def invalidate_all_caches(current_user=Depends(get_current_user)):
+    user_exists_cache.invalidate()
+    course_exists_cache.invalidate()
+    weather_cache.invalidate()
+    list_cache.invalidate()
+    return {"message": "Caches cleared"}
+
+
+# ========== GET ENDPOINTS ==========
+
+# Fast response path: rows go straight to JSON bytes with orjson instead of
+# building StudySessionOut per row and letting response_model validate it again.
+# Keys follow StudySessionOut field order; orjson writes naive datetimes exactly
+# like datetime.isoformat(). response_model stays on the routes for the docs.
+def session_dict(r) -> dict:
+    return {
+        "user_id": r[1],
+        "course_id": r[2],
+        "title": r[3],
+        "start_time": r[4],
+        "end_time": r[5],
+        "city": r[7],
+        "id": r[0],
+        "status": r[6],
+        "weather_snapshot": r[8],
+    }
+
+
+def json_response(content, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    return Response(orjson.dumps(content), status_code=status_code, media_type="application/json", headers=headers)
+
+
+# Keyset pagination cursor: opaque token over the (start_time, id) sort key
+def encode_cursor(start_time: datetime, session_id: int) -> str:
+    raw = json.dumps([start_time.isoformat(), session_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        start_time, session_id = json.loads(raw)
+        return datetime.fromisoformat(start_time), int(session_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def build_list_query(after, limit: Optional[int], user_id: Optional[int] = None, course_id: Optional[int] = None,
+                     status: Optional[str] = None, start_from: Optional[datetime] = None, start_to: Optional[datetime] = None):
+    # every filter combination is served by one of the (x, start_time, id) indexes
+    conditions, params = [], []
+    if user_id:
+        conditions.append("user_id=%s")
+        params.append(user_id)
+    if course_id:
+        conditions.append("course_id=%s")
+        params.append(course_id)
+    if status:
+        conditions.append("status=%s")
+        params.append(status)
+    if start_from:
+        conditions.append("start_time >= %s")
+        params.append(start_from)
+    if start_to:
+        conditions.append("start_time < %s")
+        params.append(start_to)
+    if after:
+        conditions.append("(start_time, id) > (%s, %s)")
+        params.extend(after)
+    sql = f"SELECT {SESSION_COLUMNS} FROM study_sessions"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY start_time, id"
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def stream_sessions(sql: str, params: list, fmt: str, readers=()):
+    """Yield rows from a server-side cursor so exports use constant memory"""
+    with get_read_conn(*readers) as conn:
+        cur = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+        cur.itersize = STREAM_BATCH_SIZE
+        cur.execute(sql, params)
+        first = True
+        if fmt == "json":
+            yield b"["
+        for r in cur:
+            body = orjson.dumps(session_dict(r))
+            if fmt == "json":
+                yield body if first else b"," + body
+            else:
+                yield body + b"\n"
+            first = False
+        if fmt == "json":
+            yield b"]"
+        cur.close()
+
+
+@app.get("/study-sessions", response_model=List[StudySessionOut])
+def list_sessions(
+    request: Request,
+    user_id: Optional[int] = None,
+    course_id: Optional[int] = None,
+    status: Optional[str] = None,
+    start_from: Optional[datetime] = Query(None, alias="from"),
+    start_to: Optional[datetime] = Query(None, alias="to"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+    current_user=Depends(get_current_user),
+):
+    after = decode_cursor(cursor) if cursor else None
+    filters = dict(user_id=user_id, course_id=course_id, status=status, start_from=start_from, start_to=start_to)
+    readers = (current_user["payload"].get("id"), user_id)
+    if user_id:
+        log_info(request.url.path, request.state.correlation_id, f"Fetching study sessions for user_id: {user_id}")
     else:
         log_info(request.url.path, request.state.correlation_id, "Fetching all study sessions")
+
+    if stream:
+        sql, params = build_list_query(after, limit, **filters)
+        media_type = "application/x-ndjson" if stream == "ndjson" else "application/json"
+        return StreamingResponse(stream_sessions(sql, params, stream, readers), media_type=media_type)
+
+    # ETag = list version of the user (or of everything) + which query this is
+    query_key = str(sorted(request.query_params.multi_items()))
+    if_none_match = [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+    rows = cached = None
+    with get_read_conn(*readers) as conn:
+        cur = conn.cursor()
+        # version and rows come from one snapshot of one server, so a body is never
+        # cached or tagged under a version it doesn't reflect
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        version = list_version(cur, user_id)
+        etag = f'W/"{version}-{zlib.crc32(query_key.encode()):08x}"'
+        not_modified = etag in if_none_match or "*" in if_none_match
+        if not not_modified:
+            cached = list_cache.get((query_key, version)) if LIST_CACHE_ENABLED else MISSING
+            if cached is MISSING:
+                # fetch one extra row to know whether another page exists
+                sql, params = build_list_query(after, limit + 1 if limit else None, **filters)
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+        cur.close()
+        conn.rollback()
+
+    if not_modified:
+        log_info(request.url.path, request.state.correlation_id, "Study sessions not modified")
+        return Response(status_code=304, headers={"ETag": etag})
+    if rows is None:
+        body, headers = cached
+    else:
+        headers = {}
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1][4], rows[-1][0])
+        body = orjson.dumps([session_dict(r) for r in rows])
+        if LIST_CACHE_ENABLED and len(body) <= LIST_CACHE_MAX_ENTRY_BYTES:
+            list_cache.set((query_key, version), (body, headers))
+        log_info(request.url.path, request.state.correlation_id, f"Retrieved {len(rows)} study sessions")
+
+    return Response(body, media_type="application/json", headers={**headers, "ETag": etag})
+
+
+@app.get("/study-sessions/conflicts", response_model=List[StudySessionOut])
+def list_conflicts(
+    request: Request,
+    user_id: int,
+    start: datetime,
+    end: datetime,
+    exclude_id: Optional[int] = None,
+    current_user=Depends(get_current_user),
+):
+    """Sessions of the user that overlap [start, end), via the (user_id, period) GiST index"""
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    log_info(request.url.path, request.state.correlation_id, f"Checking conflicts for user {user_id}")
+    with get_conn() as conn:
+        cur = conn.cursor()
         cur.execute(
-            """
-            SELECT id,user_id,course_id,title,start_time,end_time,status,city,weather_snapshot
+            f"""
+            SELECT {SESSION_COLUMNS}
             FROM study_sessions
-            ORDER BY start_time
+            WHERE user_id=%s AND period && tsrange(%s, %s, '[)') AND id IS DISTINCT FROM %s
+              -- implied by the overlap, but lets a partitioned table skip later ranges
+              AND start_time < %s
+            ORDER BY start_time, id
+            """,
+            (user_id, start, end, exclude_id, end),
+        )
+        rows = cur.fetchall()
+        cur.close()
+    return json_response([session_dict(r) for r in rows])
+
+
+@app.get("/study-sessions/free-slots")
+def free_slots(
+    request: Request,
+    user_id: int,
+    start_from: datetime = Query(..., alias="from"),
+    start_to: datetime = Query(..., alias="to"),
+    duration: int = Query(..., ge=1, description="minimum slot length in minutes"),
+    current_user=Depends(get_current_user),
+):
+    """Open gaps of at least `duration` minutes in [from, to), computed in SQL with multiranges"""
+    if start_to <= start_from:
+        raise HTTPException(status_code=400, detail="to must be after from")
+    log_info(request.url.path, request.state.correlation_id, f"Finding free slots for user {user_id}")
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
             """
+            SELECT lower(gap), upper(gap)
+            FROM (
+                SELECT unnest(
+                    tsmultirange(tsrange(%(from)s, %(to)s, '[)'))
+                    - COALESCE(range_agg(period), '{}'::tsmultirange)
+                ) AS gap
+                FROM study_sessions
+                WHERE user_id=%(user_id)s AND period && tsrange(%(from)s, %(to)s, '[)') AND start_time < %(to)s
+            ) gaps
+            WHERE upper(gap) - lower(gap) >= %(duration)s * interval '1 minute'
+            ORDER BY lower(gap)
+            """,
+            {"user_id": user_id, "from": start_from, "to": start_to, "duration": duration},
         )
+        rows = cur.fetchall()
+        cur.close()
+    return [{"start": r[0].isoformat(), "end": r[1].isoformat()} for r in rows]
+
+
+def summarize_stats(rows) -> dict:
+    summary = {"total_sessions": 0, "total_hours": 0.0, "planned_sessions": 0, "planned_hours": 0.0,
+               "completed_sessions": 0, "completed_hours": 0.0}
+    for status, sessions, seconds in rows:
+        hours = seconds / 3600
+        summary["total_sessions"] += sessions
+        summary["total_hours"] += hours
+        if status == "PLANNED":
+            summary["planned_sessions"] += sessions
+            summary["planned_hours"] += hours
+        elif status == "COMPLETED":
+            summary["completed_sessions"] += sessions
+            summary["completed_hours"] += hours
+    for key in ("total_hours", "planned_hours", "completed_hours"):
+        summary[key] = round(summary[key], 2)
+    return summary
+
+
+@app.get("/study-sessions/stats")
+def session_stats(request: Request, user_id: Optional[int] = None, course_id: Optional[int] = None,
+                  current_user=Depends(get_current_user)):
+    """Planned vs completed totals from the session_stats summary table, independent of history size"""
+    if not user_id and not course_id:
+        raise HTTPException(status_code=400, detail="user_id or course_id required")
+    log_info(request.url.path, request.state.correlation_id, f"Fetching study stats for user {user_id}, course {course_id}")
+    conditions, params = [], []
+    if user_id:
+        conditions.append("user_id=%s")
+        params.append(user_id)
+    if course_id:
+        conditions.append("course_id=%s")
+        params.append(course_id)
+    with get_read_conn(current_user["payload"].get("id"), user_id) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT course_id, status, sessions, seconds
+            FROM session_stats
+            WHERE {" AND ".join(conditions)} AND sessions > 0
+            ORDER BY course_id
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+        cur.close()
 
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    by_course = {}
+    for r in rows:
+        by_course.setdefault(r[0], []).append(r[1:])
+    return {
+        "user_id": user_id,
+        "course_id": course_id,
+        "totals": summarize_stats([r[1:] for r in rows]),
+        "courses": [{"course_id": c, **summarize_stats(course_rows)} for c, course_rows in by_course.items()],
+    }
 
-    log_info(request.url.path, request.state.correlation_id, f"Retrieved {len(rows)} study sessions")
-    return [
-        StudySessionOut(
-            id=r[0],
-            user_id=r[1],
-            course_id=r[2],
-            title=r[3],
-            start_time=r[4].isoformat(),
-            end_time=r[5].isoformat(),
-            status=r[6],
-            city=r[7],
-            weather_snapshot=r[8]
-        )
-        for r in rows
-    ]
+
+def changes_head() -> str:
+    """Cursor before every entry not exposed yet; may replay a few the caller's list already has"""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        head = cur.fetchone()[0]
+        cur.close()
+    return encode_change_cursor(head, 0)
+
+
+def read_changes(since: tuple, limit: int, user_id: Optional[int]):
+    """Exposed entries after the (xid, seq) key `since`, or None when the log no longer reaches back that far"""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pruned_xid::text::bigint, pruned_through FROM session_changes_state")
+        if since < cur.fetchone():
+            cur.close()
+            return None
+        sql = f"SELECT {CHANGE_COLUMNS} FROM session_changes WHERE (xid, seq) > (%s::xid8, %s) AND {CHANGES_VISIBLE}"
+        params = [str(since[0]), since[1]]
+        if user_id:
+            # archive markers have no user and are addressed to everyone
+            sql += " AND (user_id=%s OR user_id IS NULL)"
+            params.append(user_id)
+        cur.execute(sql + " ORDER BY xid, seq LIMIT %s", params + [limit])
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+# Incremental sync: clients load the list once, then follow the change log from the
+# cursor they got. Without `since` the current head is returned, so take the cursor
+# before loading the list and nothing in between is missed.
+@app.get("/study-sessions/changes")
+async def session_changes(
+    request: Request,
+    since: Optional[str] = None,
+    user_id: Optional[int] = None,
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    wait: float = Query(0, ge=0, le=CHANGES_MAX_WAIT),
+    current_user=Depends(get_current_user),
+):
+    if since is None:
+        head = await run_in_threadpool(changes_head)
+        return json_response({"changes": [], "cursor": head, "has_more": False})
+    if since.isdigit():
+        # cursor from before the log was keyed by transaction
+        raise HTTPException(status_code=410, detail="Cursor expired, reload sessions and start from a new cursor")
+    position = decode_change_cursor(since)
+    if position is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    feed = get_change_feed()
+    while True:
+        signal = feed.signal() if feed is not None else None
+        rows = await run_in_threadpool(read_changes, position, limit, user_id)
+        if rows is None:
+            raise HTTPException(status_code=410, detail="Cursor expired, reload sessions and start from a new cursor")
+        remaining = deadline - loop.time()
+        if rows or remaining <= 0:
+            break
+        if feed is not None and feed.listening:
+            await feed.wait(signal, remaining)
+        else:
+            await asyncio.sleep(min(remaining, CHANGES_POLL_INTERVAL))
+
+    cursor = encode_change_cursor(int(rows[-1][6]), rows[-1][0]) if rows else since
+    return json_response({
+        "changes": [change_dict(r) for r in rows],
+        "cursor": cursor,
+        "has_more": len(rows) == limit,
+    })
+
+
+@app.get("/study-sessions/delete-jobs/{job_id}")
+def get_delete_job(job_id: int, current_user=Depends(get_current_user)):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {DELETE_JOB_COLUMNS} FROM delete_jobs WHERE id=%s", (job_id,))
+        row = cur.fetchone()
+        cur.close()
+    if not row:
+        raise HTTPException(status_code=404, detail="Delete job not found")
+    return json_response(delete_job_dict(row))
 
 
 @app.get("/study-sessions/{session_id}", response_model=StudySessionOut)
 def get_session(request: Request, session_id: int, current_user=Depends(get_current_user)):
-    conn = get_conn()
-    cur = conn.cursor()
-    log_info(request.url.path, request.state.correlation_id, f"Fetching study session with id: {session_id}")
-    cur.execute(
-        """
-        SELECT id,user_id,course_id,title,start_time,end_time,status,city,weather_snapshot
-        FROM study_sessions
-        WHERE id=%s
-        """,
-        (session_id,),
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_read_conn(current_user["payload"].get("id")) as conn:
+        cur = conn.cursor()
+        log_info(request.url.path, request.state.correlation_id, f"Fetching study session with id: {session_id}")
+        cur.execute(
+            f"""
+            SELECT {SESSION_COLUMNS}
+            FROM study_sessions
+            WHERE id=%s
+            """,
+            (session_id,),
+        )
+        row = cur.fetchone()
+        cur.close()
 
     if not row:
         log_error(request.url.path, request.state.correlation_id, f"Study session {session_id} not found")
         raise HTTPException(status_code=404, detail="Session not found")
 
     log_info(request.url.path, request.state.correlation_id, f"Successfully retrieved study session {session_id}")
-    return StudySessionOut(
-        id=row[0],
-        user_id=row[1],
-        course_id=row[2],
-        title=row[3],
-        start_time=row[4].isoformat(),
-        end_time=row[5].isoformat(),
-        status=row[6],
-        city=row[7],
-        weather_snapshot=row[8]
-    )
+    return json_response(session_dict(row))
 
 
 # ========== POST ENDPOINTS ==========
 
+def insert_session(session: StudySessionIn, city: str, weather_data: Optional[dict], weather_pending: bool = False):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        weather_id = store_snapshots(cur, {city: weather_data}).get(normalize_city(city))
+        cur.execute(
+            f"""
+            INSERT INTO study_sessions (user_id, course_id, title, start_time, end_time, city, weather_id, weather_pending)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+            RETURNING {SESSION_COLUMNS}
+            """,
+            (
+                session.user_id,
+                session.course_id,
+                session.title,
+                session.start_time,
+                session.end_time,
+                city,
+                weather_id,
+                weather_pending,
+            ),
+        )
+
+        row = cur.fetchone()
+        after_write(cur, new_rows=[row])
+        conn.commit()
+        cur.close()
+    return row
+
+
 @app.post("/study-sessions", response_model=StudySessionOut, status_code=201)
-def create_session(request: Request, session: StudySessionIn, current_user=Depends(get_current_user)):
+async def create_session(request: Request, session: StudySessionIn, current_user=Depends(get_current_user)):
 
     token = current_user.get('token') if isinstance(current_user, dict) else None
 
     log_info(request.url.path, request.state.correlation_id, f"Creating study session for user {session.user_id}, course {session.course_id}")
 
-    if not user_exists(session.user_id, token=token):
+    # User, course and weather lookups are independent, so run them concurrently
+    city = session.city or "ljubljana"
+    deferred = WEATHER_MODE == "deferred"
+    lookups = [user_exists(session.user_id, token=token), course_exists(session.course_id, token=token)]
+    if not deferred:
+        lookups.append(get_weather_for_location(city, token=token, correlation_id=request.state.correlation_id))
+    user_ok, course_ok, *weather = await asyncio.gather(*lookups)
+    weather_data = weather[0] if weather else None
+
+    if not user_ok:
         log_error(request.url.path, request.state.correlation_id, f"User {session.user_id} does not exist")
         raise HTTPException(status_code=400, detail="User ne obstaja")
-    if not course_exists(session.course_id, token=token):
+    if not course_ok:
         log_error(request.url.path, request.state.correlation_id, f"Course {session.course_id} does not exist")
         raise HTTPException(status_code=400, detail="Course ne obstaja")
 
-    # Fetch weather data from weather-service for provided city
-    city = session.city or "ljubljana"
-    weather_data = None
-    try:
-        headers = {"x-correlation-id": request.state.correlation_id}
-        if token:
-            headers["Authorization"] = f"Bearer {token}"
-        r = requests.get(f"{WEATHER_SERVICE_URL}/weather/{city}", headers=headers, timeout=2)
-        if r.status_code == 200:
-            weather_data = r.json()
-    except Exception as e:
-        print(f"Failed to fetch weather for {city}: {e}")
-    if weather_data:
+    if deferred:
+        log_info(request.url.path, request.state.correlation_id, "Weather deferred to background worker")
+    elif weather_data:
         weather_info = f"{weather_data.get('conditions', 'unknown')}, {weather_data.get('tempC', 'N/A')}°C"
         log_info(request.url.path, request.state.correlation_id, f"Weather fetched for study session: {weather_info}")
     else:
         log_info(request.url.path, request.state.correlation_id, "Weather data not available")
 
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO study_sessions (user_id, course_id, title, start_time, end_time, city, weather_snapshot)
-        VALUES (%s,%s,%s,%s,%s,%s,%s)
-        RETURNING id,user_id,course_id,title,start_time,end_time,status,city,weather_snapshot
-        """,
-        (
-            session.user_id,
-            session.course_id,
-            session.title,
-            session.start_time,
-            session.end_time,
-            city,
-            Json(weather_data) if weather_data else None,
-        ),
-    )
-
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    row = await run_in_threadpool(insert_session, session, city, weather_data, deferred)
+    if deferred:
+        wake_weather_worker()
 
     log_info(request.url.path, request.state.correlation_id, f"Study session created successfully with id {row[0]}")
-    return StudySessionOut(
-        id=row[0],
-        user_id=row[1],
-        course_id=row[2],
-        title=row[3],
-        start_time=row[4].isoformat(),
-        end_time=row[5].isoformat(),
-        status=row[6],
-        city=row[7],
-        weather_snapshot=row[8]
+    return json_response(session_dict(row), status_code=201)
+
+
+def insert_sessions_bulk(rows: list, weather: dict):
+    """Insert all rows with one multi-row INSERT in a single transaction; rows end with (city, pending)"""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        weather_ids = store_snapshots(cur, weather)
+        rows = [(*r[:-1], weather_ids.get(normalize_city(r[5])), r[-1]) for r in rows]
+        created = execute_values(
+            cur,
+            f"""
+            INSERT INTO study_sessions (user_id, course_id, title, start_time, end_time, city, weather_id, weather_pending)
+            VALUES %s
+            RETURNING {SESSION_COLUMNS}
+            """,
+            rows,
+            page_size=len(rows),
+            fetch=True,
+        )
+        after_write(cur, new_rows=created)
+        conn.commit()
+        cur.close()
+    return created
+
+
+@app.post("/study-sessions/bulk")
+async def create_sessions_bulk(request: Request, payload: BulkSessionsIn, current_user=Depends(get_current_user)):
+    token = current_user.get('token') if isinstance(current_user, dict) else None
+    sessions = payload.sessions
+    if not sessions:
+        raise HTTPException(status_code=400, detail="No sessions given")
+    if len(sessions) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_SIZE} sessions per request")
+
+    log_info(request.url.path, request.state.correlation_id, f"Bulk creating {len(sessions)} study sessions")
+
+    # validate each distinct user/course once and fetch weather once per city, all concurrently
+    user_ids = sorted({s.user_id for s in sessions})
+    course_ids = sorted({s.course_id for s in sessions})
+    cities = sorted({normalize_city(s.city) for s in sessions})
+    deferred = WEATHER_MODE == "deferred"
+    answers = await asyncio.gather(
+        *(user_exists(u, token=token) for u in user_ids),
+        *(course_exists(c, token=token) for c in course_ids),
+        *(get_weather_for_location(c, token=token, correlation_id=request.state.correlation_id)
+          for c in ([] if deferred else cities)),
     )
+    valid_users = dict(zip(user_ids, answers[:len(user_ids)]))
+    valid_courses = dict(zip(course_ids, answers[len(user_ids):len(user_ids) + len(course_ids)]))
+    weather = dict(zip(cities, answers[len(user_ids) + len(course_ids):]))
+
+    results = [None] * len(sessions)
+    rows, row_indexes = [], []
+    for i, s in enumerate(sessions):
+        if not valid_users[s.user_id]:
+            results[i] = {"index": i, "status": 400, "detail": "User ne obstaja"}
+            continue
+        if not valid_courses[s.course_id]:
+            results[i] = {"index": i, "status": 400, "detail": "Course ne obstaja"}
+            continue
+        try:
+            start, end = datetime.fromisoformat(s.start_time), datetime.fromisoformat(s.end_time)
+        except ValueError:
+            results[i] = {"index": i, "status": 400, "detail": "Invalid start_time/end_time"}
+            continue
+        if end <= start:
+            results[i] = {"index": i, "status": 400, "detail": "end_time must be after start_time"}
+            continue
+        rows.append((s.user_id, s.course_id, s.title, s.start_time, s.end_time, s.city or "ljubljana", deferred))
+        row_indexes.append(i)
+
+    if rows:
+        created = await run_in_threadpool(insert_sessions_bulk, rows, weather)
+        for i, row in zip(row_indexes, created):
+            results[i] = {"index": i, "status": 201, "session": session_dict(row)}
+        if deferred:
+            wake_weather_worker()
+
+    failed = len(sessions) - len(rows)
+    log_info(request.url.path, request.state.correlation_id, f"Bulk create finished: {len(rows)} created, {failed} failed")
+    return json_response({"created": len(rows), "failed": failed, "results": results}, status_code=201 if not failed else 207)
+
+
+def lock_sessions(cur, ids: List[int]) -> list:
+    """Current rows of the given sessions, locked until commit (in id order to avoid deadlocks)"""
+    cur.execute(f"SELECT {SESSION_COLUMNS} FROM study_sessions WHERE id = ANY(%s) ORDER BY id FOR UPDATE", (list(ids),))
+    return cur.fetchall()
+
+
+def complete_sessions_batch(ids: List[int]):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        old_rows = lock_sessions(cur, ids)
+        updated = execute_values(
+            cur,
+            f"""
+            UPDATE study_sessions AS s
+            SET status='COMPLETED'
+            FROM (VALUES %s) AS v(id)
+            WHERE s.id=v.id
+            RETURNING {qualified_columns("s")}
+            """,
+            [(i,) for i in ids],
+            page_size=len(ids),
+            fetch=True,
+        )
+        after_write(cur, old_rows, updated)
+        conn.commit()
+        cur.close()
+    return {r[0] for r in updated}
+
+
+# declared before /study-sessions/{session_id}/complete, which would otherwise match it
+@app.post("/study-sessions/batch/complete")
+def complete_sessions(request: Request, payload: BatchCompleteIn, current_user=Depends(get_current_user)):
+    ids = list(dict.fromkeys(payload.ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(ids) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_SIZE} ids per request")
+
+    log_info(request.url.path, request.state.correlation_id, f"Marking {len(ids)} study sessions as completed")
+    updated = complete_sessions_batch(ids)
+    not_found = [i for i in ids if i not in updated]
+    if not_found:
+        log_error(request.url.path, request.state.correlation_id, f"Study sessions not found for completion: {not_found}")
+
+    log_info(request.url.path, request.state.correlation_id, f"{len(updated)} study sessions marked as completed")
+    return {"updated": [i for i in ids if i in updated], "not_found": not_found}
 
 
 @app.post("/study-sessions/{session_id}/complete")
 def complete_session(request: Request, session_id: int, current_user=Depends(get_current_user)):
-    conn = get_conn()
-    cur = conn.cursor()
-    log_info(request.url.path, request.state.correlation_id, f"Marking study session {session_id} as completed")
-    cur.execute(
-        """
-        UPDATE study_sessions
-        SET status='COMPLETED'
-        WHERE id=%s
-        RETURNING id
-        """,
-        (session_id,),
-    )
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        log_info(request.url.path, request.state.correlation_id, f"Marking study session {session_id} as completed")
+        old_rows = lock_sessions(cur, [session_id])
+        cur.execute(
+            f"""
+            UPDATE study_sessions
+            SET status='COMPLETED'
+            WHERE id=%s
+            RETURNING {SESSION_COLUMNS}
+            """,
+            (session_id,),
+        )
+        row = cur.fetchone()
+        if row:
+            after_write(cur, old_rows, [row])
+        conn.commit()
+        cur.close()
 
     if not row:
         log_error(request.url.path, request.state.correlation_id, f"Study session {session_id} not found for completion")
@@ -425,68 +1991,124 @@ def complete_session(request: Request, session_id: int, current_user=Depends(get
 
 # ========== PUT ENDPOINTS ==========
 
+def reschedule_sessions_batch(items: List[RescheduleItem]):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        old_rows = lock_sessions(cur, [item.id for item in items])
+        updated = execute_values(
+            cur,
+            f"""
+            UPDATE study_sessions AS s
+            SET start_time=v.new_start, end_time=v.new_end
+            FROM (VALUES %s) AS v(id, new_start, new_end)
+            WHERE s.id=v.id
+            RETURNING {qualified_columns("s")}
+            """,
+            [(item.id, item.new_start, item.new_end) for item in items],
+            template="(%s, %s::timestamp, %s::timestamp)",
+            page_size=len(items),
+            fetch=True,
+        )
+        after_write(cur, old_rows, updated)
+        conn.commit()
+        cur.close()
+    return {r[0] for r in updated}
+
+
+@app.put("/study-sessions/batch/reschedule")
+def reschedule_sessions(request: Request, payload: BatchRescheduleIn, current_user=Depends(get_current_user)):
+    # last entry wins when the same id is sent twice
+    items = list({item.id: item for item in payload.items}.values())
+    if not items:
+        raise HTTPException(status_code=400, detail="No items given")
+    if len(items) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_SIZE} items per request")
+
+    log_info(request.url.path, request.state.correlation_id, f"Rescheduling {len(items)} study sessions")
+    updated = reschedule_sessions_batch(items)
+    not_found = [item.id for item in items if item.id not in updated]
+    if not_found:
+        log_error(request.url.path, request.state.correlation_id, f"Study sessions not found for rescheduling: {not_found}")
+
+    log_info(request.url.path, request.state.correlation_id, f"{len(updated)} study sessions rescheduled")
+    return {"updated": [item.id for item in items if item.id in updated], "not_found": not_found}
+
+
+def update_session_row(session_id: int, session: StudySessionIn):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        old_rows = lock_sessions(cur, [session_id])
+        cur.execute(
+            f"""
+            UPDATE study_sessions
+            SET user_id=%s, course_id=%s, title=%s, start_time=%s, end_time=%s
+            WHERE id=%s
+            RETURNING {SESSION_COLUMNS}
+            """,
+            (
+                session.user_id,
+                session.course_id,
+                session.title,
+                session.start_time,
+                session.end_time,
+                session_id,
+            ),
+        )
+
+        row = cur.fetchone()
+        if row:
+            after_write(cur, old_rows, [row])
+        conn.commit()
+        cur.close()
+    return row
+
+
 @app.put("/study-sessions/{session_id}", response_model=StudySessionOut)
-def update_session(request: Request, session_id: int, session: StudySessionIn, current_user=Depends(get_current_user)):
-    conn = get_conn()
-    cur = conn.cursor()
+async def update_session(request: Request, session_id: int, session: StudySessionIn, current_user=Depends(get_current_user)):
+    token = current_user.get('token') if isinstance(current_user, dict) else None
     log_info(request.url.path, request.state.correlation_id, f"Updating study session {session_id}")
-    cur.execute(
-        """
-        UPDATE study_sessions
-        SET user_id=%s, course_id=%s, title=%s, start_time=%s, end_time=%s
-        WHERE id=%s
-        RETURNING id,user_id,course_id,title,start_time,end_time,status
-        """,
-        (
-            session.user_id,
-            session.course_id,
-            session.title,
-            session.start_time,
-            session.end_time,
-            session_id,
-        ),
-    )
 
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    user_ok, course_ok = await asyncio.gather(
+        user_exists(session.user_id, token=token),
+        course_exists(session.course_id, token=token),
+    )
+    if not user_ok:
+        log_error(request.url.path, request.state.correlation_id, f"User {session.user_id} does not exist")
+        raise HTTPException(status_code=400, detail="User ne obstaja")
+    if not course_ok:
+        log_error(request.url.path, request.state.correlation_id, f"Course {session.course_id} does not exist")
+        raise HTTPException(status_code=400, detail="Course ne obstaja")
 
+    row = await run_in_threadpool(update_session_row, session_id, session)
     if not row:
         log_error(request.url.path, request.state.correlation_id, f"Study session {session_id} not found for update")
         raise HTTPException(status_code=404, detail="Session not found")
 
     log_info(request.url.path, request.state.correlation_id, f"Study session {session_id} updated successfully")
-    return StudySessionOut(
-        id=row[0],
-        user_id=row[1],
-        course_id=row[2],
-        title=row[3],
-        start_time=row[4].isoformat(),
-        end_time=row[5].isoformat(),
-        status=row[6],
-    )
+    return json_response(session_dict(row))
 
 
 @app.put("/study-sessions/{session_id}/reschedule")
 def reschedule_session(request: Request, session_id: int, new_start: str, new_end: str, current_user=Depends(get_current_user)):
-    conn = get_conn()
-    cur = conn.cursor()
-    log_info(request.url.path, request.state.correlation_id, f"Rescheduling study session {session_id}")
-    cur.execute(
-        """
-        UPDATE study_sessions
-        SET start_time=%s, end_time=%s
-        WHERE id=%s
-        RETURNING id
-        """,
-        (new_start, new_end, session_id),
-    )
+    with get_conn() as conn:
+        cur = conn.cursor()
+        log_info(request.url.path, request.state.correlation_id, f"Rescheduling study session {session_id}")
+        old_rows = lock_sessions(cur, [session_id])
+        cur.execute(
+            f"""
+            UPDATE study_sessions
+            SET start_time=%s, end_time=%s
+            WHERE id=%s
+            RETURNING {SESSION_COLUMNS}
+            """,
+            (new_start, new_end, session_id),
+        )
 
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+        row = cur.fetchone()
+        if row:
+            after_write(cur, old_rows, [row])
+        conn.commit()
+        cur.close()
 
     if not row:
         log_error(request.url.path, request.state.correlation_id, f"Study session {session_id} not found for rescheduling")
@@ -500,33 +2122,187 @@ def reschedule_session(request: Request, session_id: int, new_start: str, new_en
 
 @app.delete("/study-sessions/{session_id}")
 def delete_session(request: Request, session_id: int, current_user=Depends(get_current_user)):
-    conn = get_conn()
-    cur = conn.cursor()
-    log_info(request.url.path, request.state.correlation_id, f"Deleting study session {session_id}")
-    cur.execute("DELETE FROM study_sessions WHERE id=%s", (session_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        log_info(request.url.path, request.state.correlation_id, f"Deleting study session {session_id}")
+        cur.execute(f"DELETE FROM study_sessions WHERE id=%s RETURNING {SESSION_COLUMNS}", (session_id,))
+        after_write(cur, old_rows=cur.fetchall())
+        conn.commit()
+        cur.close()
 
     log_info(request.url.path, request.state.correlation_id, f"Study session {session_id} deleted successfully")
     return {"message": "Session deleted"}
 
 
-@app.delete("/study-sessions")
-def delete_all_sessions(request: Request, user_id: Optional[int] = None, current_user=Depends(get_current_user)):
-    conn = get_conn()
-    cur = conn.cursor()
+def delete_job_dict(r) -> dict:
+    return {
+        "id": r[0],
+        "user_id": r[1],
+        "status": r[2],
+        "deleted": r[3],
+        "total": r[4],
+        "progress": round(min(r[3] / r[4], 1.0), 4) if r[4] else (1.0 if r[2] == "done" else 0.0),
+        "error": r[5],
+        "created_at": r[6],
+        "finished_at": r[7],
+    }
+
+
+DELETE_JOB_COLUMNS = "id,user_id,status,deleted,total,error,created_at,finished_at"
+
+
+def start_delete_job(user_id: Optional[int]) -> tuple:
+    """The running job for this user (or for everything), or a new one; returns (job row, max_id)"""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        # serialize starts so two requests don't both create a job
+        cur.execute("LOCK TABLE delete_jobs IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute(
+            f"SELECT {DELETE_JOB_COLUMNS}, max_id FROM delete_jobs WHERE status='running' AND user_id IS NOT DISTINCT FROM %s",
+            (user_id,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            if user_id:
+                cur.execute("SELECT COALESCE(max(id), 0), count(*) FROM study_sessions WHERE user_id=%s", (user_id,))
+            else:
+                # counting everything would be the full scan we are avoiding; the planner estimate will do
+                cur.execute(
+                    """
+                    SELECT (SELECT COALESCE(max(id), 0) FROM study_sessions),
+                           (SELECT COALESCE(sum(GREATEST(reltuples, 0)), 0)::bigint FROM pg_class
+                            WHERE oid='study_sessions'::regclass
+                               OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent='study_sessions'::regclass))
+                    """
+                )
+            max_id, total = cur.fetchone()
+            cur.execute(
+                f"INSERT INTO delete_jobs (user_id, max_id, total) VALUES (%s, %s, %s) RETURNING {DELETE_JOB_COLUMNS}, max_id",
+                (user_id, max_id, total),
+            )
+            row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    return row[:-1], row[-1]
+
+
+def delete_chunk(job_id: int, user_id: Optional[int], max_id: int, after) -> tuple:
+    """Delete up to DELETE_CHUNK_SIZE of the job's rows after the (start_time, id) key `after`.
+
+    Each chunk is its own short transaction, with the usual derived-state bookkeeping.
+    Returns (rows deleted, key of the last row picked), the key being None once nothing is left.
+    """
+    conditions, params = ["id <= %s"], [max_id]
+    if user_id:
+        conditions.append("user_id=%s")
+        params.append(user_id)
+    if after:
+        conditions.append("(start_time, id) > (%s, %s)")
+        params.extend(after)
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT id, start_time FROM study_sessions
+            WHERE {" AND ".join(conditions)}
+            ORDER BY start_time, id LIMIT %s
+            """,
+            params + [DELETE_CHUNK_SIZE],
+        )
+        picked = cur.fetchall()
+        if not picked:
+            conn.rollback()
+            cur.close()
+            return 0, None
+        # locked in id order like every other writer, so chunks can't deadlock with batch updates
+        locked = [r for r in lock_sessions(cur, [r[0] for r in picked]) if not user_id or r[1] == user_id]
+        cur.execute(
+            f"DELETE FROM study_sessions WHERE id = ANY(%s) AND start_time = ANY(%s) RETURNING {SESSION_COLUMNS}",
+            ([r[0] for r in locked], [r[4] for r in locked]),
+        )
+        deleted = cur.fetchall()
+        after_write(cur, old_rows=deleted)
+        cur.execute("UPDATE delete_jobs SET deleted=deleted+%s WHERE id=%s", (len(deleted), job_id))
+        conn.commit()
+        cur.close()
+    return len(deleted), (picked[-1][1], picked[-1][0])
+
+
+def finish_delete_job(job_id: int, error: Optional[str] = None):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE delete_jobs SET status=%s, error=%s, finished_at=timezone('utc', now()) WHERE id=%s AND status='running'",
+            ("failed" if error else "done", error, job_id),
+        )
+        conn.commit()
+        cur.close()
+
+
+async def run_delete_job(job_id: int, user_id: Optional[int], max_id: int, correlation_id: Optional[str] = None):
+    """Walk the job's rows in (start_time, id) order, then sweep once more from the start
+    for rows that a reschedule moved behind the walk"""
+    after = None
+    total = 0
+    backoff = DELETE_CHUNK_PAUSE or 0.05
+    try:
+        while True:
+            try:
+                deleted, last = await run_in_threadpool(delete_chunk, job_id, user_id, max_id, after)
+            except (PoolTimeout, OperationalError) as e:
+                log_error("/study-sessions", correlation_id,
+                          f"Delete job {job_id} chunk failed: {str(e).strip() or type(e).__name__}, retrying in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, DELETE_RETRY_MAX)
+                continue
+            backoff = DELETE_CHUNK_PAUSE or 0.05
+            total += deleted
+            if last is None:
+                if after is None:
+                    break
+                after = None
+                continue
+            after = last
+            await asyncio.sleep(DELETE_CHUNK_PAUSE)
+        await run_in_threadpool(finish_delete_job, job_id)
+        log_info("/study-sessions", correlation_id, f"Delete job {job_id} finished: {total} sessions deleted")
+    except asyncio.CancelledError:
+        # shutdown; the job stays running and is resumed at the next startup
+        raise
+    except Exception as e:
+        log_error("/study-sessions", correlation_id, f"Delete job {job_id} failed: {str(e)}")
+        await run_in_threadpool(finish_delete_job, job_id, str(e) or type(e).__name__)
+    finally:
+        delete_tasks.pop(job_id, None)
+
 
+def spawn_delete_job(job_id: int, user_id: Optional[int], max_id: int, correlation_id: Optional[str] = None):
+    if job_id not in delete_tasks:
+        delete_tasks[job_id] = asyncio.create_task(run_delete_job(job_id, user_id, max_id, correlation_id))
+
+
+def running_delete_jobs() -> list:
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, user_id, max_id FROM delete_jobs WHERE status='running' ORDER BY id")
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+# Deleting everything (or a user's sessions) in one statement would hold locks and
+# write one huge transaction; instead a background job deletes in chunks and the
+# caller follows its progress.
+@app.delete("/study-sessions", status_code=202)
+async def delete_all_sessions(request: Request, user_id: Optional[int] = None, current_user=Depends(get_current_user)):
     if user_id:
         log_info(request.url.path, request.state.correlation_id, f"Deleting all study sessions for user {user_id}")
-        cur.execute("DELETE FROM study_sessions WHERE user_id=%s", (user_id,))
     else:
         log_info(request.url.path, request.state.correlation_id, "Deleting all study sessions")
-        cur.execute("DELETE FROM study_sessions")
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-    log_info(request.url.path, request.state.correlation_id, "Sessions deleted successfully")
-    return {"message": "Sessions deleted"}
+    job, max_id = await run_in_threadpool(start_delete_job, user_id)
+    spawn_delete_job(job[0], user_id, max_id, request.state.correlation_id)
+    return json_response(
+        {"message": "Deletion started", "job": delete_job_dict(job)},
+        status_code=202,
+        headers={"Location": f"/study-sessions/delete-jobs/{job[0]}"},
+    )
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+from collections import Counter
+
+from http_client import get_http_client
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_SERVICE_URL = os.getenv("METRICS_SERVICE_URL", "http://localhost:4007")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))
+METRICS_FLUSH_SIZE = int(os.getenv("METRICS_FLUSH_SIZE", "1000"))
+METRICS_BUFFER_SIZE = int(os.getenv("METRICS_BUFFER_SIZE", "20000"))
+METRICS_MAX_ENDPOINTS = int(os.getenv("METRICS_MAX_ENDPOINTS", "500"))
+SERVICE_NAME = "planner-service"
+
+
+class MetricsAggregator:
+    """Buffers request latencies as per-endpoint/method histograms and ships them in batches"""
+
+    def __init__(self, url=METRICS_SERVICE_URL, flush_interval=METRICS_FLUSH_INTERVAL,
+                 flush_size=METRICS_FLUSH_SIZE, buffer_size=METRICS_BUFFER_SIZE,
+                 max_endpoints=METRICS_MAX_ENDPOINTS):
+        self.url = url
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.buffer_size = buffer_size
+        self.max_endpoints = max_endpoints
+        self._lock = threading.Lock()
+        self._histograms = {}  # (endpoint, method) -> Counter(latency_ms -> count)
+        self._pending = 0
+        self._wakeup = None
+        self._task = None
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+
+    def record(self, endpoint, method, response_time_ms):
+        """Add one observation; never blocks on I/O, drops when the buffer is full"""
+        key = (endpoint, method)
+        with self._lock:
+            if self._pending >= self.buffer_size:
+                self.dropped += 1
+                return
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                if len(self._histograms) >= self.max_endpoints:
+                    self.dropped += 1
+                    return
+                histogram = self._histograms[key] = Counter()
+            histogram[int(response_time_ms)] += 1
+            self._pending += 1
+            self.recorded += 1
+            full = self._pending >= self.flush_size
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _drain(self):
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+            count, self._pending = self._pending, 0
+        return histograms, count
+
+    async def flush(self):
+        histograms, count = self._drain()
+        if not count:
+            return
+        payload = {
+            "service_name": SERVICE_NAME,
+            "calls": [
+                {
+                    "klicanaStoritev": endpoint,
+                    "method": method,
+                    "histogram": sorted(histogram.items()),
+                }
+                for (endpoint, method), histogram in histograms.items()
+            ],
+        }
+        try:
+            r = await get_http_client().post(f"{self.url}/metrics/record-batch", json=payload)
+            r.raise_for_status()
+            self.flushed += count
+        except Exception as e:
+            self.failed += count
+            print(f"[Metrics] Failed to ship {count} metrics: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker and ship whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": METRICS_ENABLED,
+                "pending": self._pending,
+                "endpoints": len(self._histograms),
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "flushed": self.flushed,
+                "failed": self.failed,
+            }
+
+
+metrics_aggregator = MetricsAggregator()
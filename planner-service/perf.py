@@ -0,0 +1,104 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# fraction of requests that get phase spans and a Server-Timing header
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", "0.1"))
+# samples kept per (route, phase) for the rolling percentiles
+PERF_WINDOW = int(os.getenv("PERF_WINDOW", "1000"))
+PERF_MAX_ROUTES = int(os.getenv("PERF_MAX_ROUTES", "200"))
+
+# phase -> accumulated ms for the current (sampled) request, None when not sampled
+_timings = ContextVar("perf_timings", default=None)
+
+
+@contextmanager
+def span(phase):
+    """Time a phase of the current request; a no-op when the request isn't sampled.
+
+    Repeated or concurrent spans of the same phase are summed, so e.g. the user and
+    course checks run under asyncio.gather can add up to more than their wall time.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def start_request():
+    """Decide whether to sample this request; returns its timings dict or None"""
+    if PERF_SAMPLE_RATE <= 0 or random.random() >= PERF_SAMPLE_RATE:
+        return None
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def server_timing(timings):
+    return ", ".join(f"{phase};dur={ms:.2f}" for phase, ms in timings.items())
+
+
+def percentile(sorted_values, p):
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+class PerfAggregator:
+    """Rolling window of phase durations per route"""
+
+    def __init__(self, window=PERF_WINDOW, max_routes=PERF_MAX_ROUTES):
+        self.window = window
+        self.max_routes = max_routes
+        self._lock = threading.Lock()
+        self._samples = {}  # route -> phase -> deque of ms
+        self.sampled = 0
+
+    def record(self, route, timings):
+        with self._lock:
+            phases = self._samples.get(route)
+            if phases is None:
+                if len(self._samples) >= self.max_routes:
+                    return
+                phases = self._samples[route] = {}
+            for phase, ms in timings.items():
+                samples = phases.get(phase)
+                if samples is None:
+                    samples = phases[phase] = deque(maxlen=self.window)
+                samples.append(ms)
+            self.sampled += 1
+
+    def report(self):
+        with self._lock:
+            snapshot = {route: {phase: sorted(samples) for phase, samples in phases.items()}
+                        for route, phases in self._samples.items()}
+            sampled = self.sampled
+        routes = {}
+        for route, phases in sorted(snapshot.items()):
+            routes[route] = {
+                phase: {
+                    "count": len(values),
+                    "mean_ms": round(sum(values) / len(values), 3),
+                    "p50_ms": round(percentile(values, 50), 3),
+                    "p95_ms": round(percentile(values, 95), 3),
+                    "p99_ms": round(percentile(values, 99), 3),
+                }
+                for phase, values in sorted(phases.items())
+            }
+        return {"sample_rate": PERF_SAMPLE_RATE, "window": self.window, "sampled": sampled, "routes": routes}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self.sampled = 0
+
+
+perf_aggregator = PerfAggregator()
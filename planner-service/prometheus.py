@@ -0,0 +1,140 @@
+import threading
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """Each thread writes only to its own shard, so recording takes no lock; scrapes merge the shards"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._register_lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.data
+        except AttributeError:
+            data = self._local.data = {}
+            with self._register_lock:
+                self._shards.append(data)
+            return data
+
+    def _snapshot(self):
+        with self._register_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Sharded):
+    type = "counter"
+
+    def inc(self, labels=(), amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def render(self):
+        totals = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        lines = self.header()
+        for labels, value in sorted(totals.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # one slot per bucket plus +Inf, then sum and count
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def render(self):
+        totals = {}
+        for shard in self._snapshot():
+            for labels, entry in shard.items():
+                merged = totals.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0, 0])
+                for i, value in enumerate(list(entry)):
+                    merged[i] += value
+        lines = self.header()
+        for labels, entry in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(entry[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {entry[-1]}")
+        return lines
+
+
+def collected(name, documentation, samples, labelnames=(), metric_type="gauge"):
+    """Render values read at scrape time (e.g. from pool stats); samples maps label tuples to numbers"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in sorted(samples.items()):
+        lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+    return lines
+
+
+http_requests_total = Counter(
+    "planner_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+http_request_duration = Histogram(
+    "planner_http_request_duration_seconds", "HTTP request latency by route, method and status",
+    ("route", "method", "status"))
+downstream_requests_total = Counter(
+    "planner_downstream_requests_total", "Calls to other services by outcome", ("service", "outcome"))
+downstream_duration = Histogram(
+    "planner_downstream_request_duration_seconds", "Latency of calls to other services", ("service",))
+
+REGISTRY = [http_requests_total, http_request_duration, downstream_requests_total, downstream_duration]
+
+
+def observe_downstream(service, seconds, ok):
+    downstream_duration.observe((service,), seconds)
+    downstream_requests_total.inc((service, "ok" if ok else "error"))
+
+
+def render(extra=()):
+    """Text exposition of every registered metric plus the given pre-rendered gauge lines"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for block in extra:
+        lines.extend(block)
+    return "\n".join(lines) + "\n"
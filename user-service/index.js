@@ -7,6 +7,7 @@ const cookieParser = require('cookie-parser');
 const crypto = require('crypto');
 const { v4: uuidv4 } = require('uuid');
 const { initializeLogger, logger, closeLogger } = require('./logger');
+const { initializeEvents, publishEvent, closeEvents } = require('./events');
 
 const JWT_SECRET = process.env.JWT_SECRET || "dev_secret";
 const JWT_EXP = process.env.JWT_EXP || "1h";
@@ -155,6 +156,17 @@ app.get('/internal/users/:id/exists', async (req, res) => {
   }
 });
 
+// Seznam vseh ID-jev uporabnikov (za začetno polnjenje/resinhronizacijo replik v drugih storitvah)
+app.get('/internal/users/ids', async (req, res) => {
+  try {
+    const result = await query("SELECT id FROM users ORDER BY id", []);
+    res.json({ ids: result.rows.map((r) => r.id) });
+  } catch (err) {
+    logger.error(req.path, req.correlationId, `Error listing user ids: ${err.message}`);
+    res.status(500).json({ message: "Error listing user ids" });
+  }
+});
+
 function authMiddleware(req, res, next) {
   const auth = req.headers.authorization;
   if (!auth) return res.status(401).json({ message: 'Authorization header required' });
@@ -308,6 +320,7 @@ app.post("/users/register", async (req, res) => {
       [email, password, name]
     );
     logger.info(req.path, req.correlationId, `User registered successfully with ID: ${result.rows[0].id}`);
+    publishEvent('user.created', { id: result.rows[0].id });
     res.status(201).json(result.rows[0]);
   } catch (err) {
     logger.error(req.path, req.correlationId, `User registration failed: ${err.message}`);
@@ -490,6 +503,7 @@ app.delete("/users/:id", authMiddleware, async (req, res) => {
   try {
     logger.info(req.path, req.correlationId, `Deleting user with ID: ${req.params.id}`);
     await query("DELETE FROM users WHERE id = $1", [req.params.id]);
+    publishEvent('user.deleted', { id: Number(req.params.id) });
     logger.info(req.path, req.correlationId, `User deleted successfully with ID: ${req.params.id}`);
     res.json({ message: "User deleted" });
   } catch (err) {
@@ -503,6 +517,7 @@ app.delete("/users", authMiddleware, async (req, res) => {
   try {
     logger.info(req.path, req.correlationId, 'Deleting all users');
     await query("DELETE FROM users", []);
+    publishEvent('user.deleted_all');
     logger.warn(req.path, req.correlationId, 'All users deleted');
     res.json({ message: "All users deleted" });
   } catch (err) {
@@ -519,6 +534,8 @@ initDb()
     return initializeLogger();
   })
   .then(() => {
+    // dogodki niso pogoj za zagon; povezava se vzpostavi v ozadju
+    initializeEvents();
     const server = app.listen(PORT, () => {
       logger.info('localhost', 'startup', `User service listening on port ${PORT}`);
     });
@@ -527,6 +544,7 @@ initDb()
     process.on('SIGTERM', async () => {
       logger.info('localhost', 'shutdown', 'SIGTERM received, shutting down gracefully');
       server.close(async () => {
+        await closeEvents();
         await closeLogger();
         process.exit(0);
       });
@@ -535,6 +553,7 @@ initDb()
     process.on('SIGINT', async () => {
       logger.info('localhost', 'shutdown', 'SIGINT received, shutting down gracefully');
       server.close(async () => {
+        await closeEvents();
         await closeLogger();
         process.exit(0);
       });